@@ -0,0 +1,388 @@
+"""
+Statistiques de remplissage et de ventes
+
+Les agrégats sont tenus à jour de façon incrémentale par des triggers,
+dans la même transaction que la création d'une séance ou d'une réservation :
+- rollup_seances : places vendues et capacité de chaque séance
+- rollup_films_daily : par film et par jour de séance
+- rollup_salles_daily : par salle et par jour de séance
+
+Un marqueur (high-water mark) retient le dernier identifiant de réservation
+comptabilisé ; catch_up() intègre les réservations plus récentes, par exemple
+celles d'une base créée avant l'installation des triggers.
+
+Usage : python analytics.py [--rebuild]
+"""
+import argparse
+import sqlite3
+from datetime import date, datetime, timedelta
+from flask import Blueprint, request, jsonify, session
+from db import get_connection
+
+# Blueprint regroupant les routes de statistiques (admin)
+bp = Blueprint('analytics', __name__)
+
+# Largeur par défaut de la période interrogée, de part et d'autre d'aujourd'hui
+DEFAULT_WINDOW_DAYS = 30
+
+ROLLUP_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS rollup_seances (
+        seance_id INTEGER PRIMARY KEY,
+        film_id INTEGER,
+        salle INTEGER,
+        day TEXT,
+        capacity INTEGER NOT NULL DEFAULT 0,
+        seats_sold INTEGER NOT NULL DEFAULT 0,
+        reservations INTEGER NOT NULL DEFAULT 0
+    );
+
+    CREATE TABLE IF NOT EXISTS rollup_films_daily (
+        film_id INTEGER,
+        day TEXT,
+        seances INTEGER NOT NULL DEFAULT 0,
+        capacity INTEGER NOT NULL DEFAULT 0,
+        seats_sold INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (film_id, day)
+    );
+    CREATE INDEX IF NOT EXISTS rollup_films_daily_day ON rollup_films_daily(day);
+
+    CREATE TABLE IF NOT EXISTS rollup_salles_daily (
+        salle INTEGER,
+        day TEXT,
+        seances INTEGER NOT NULL DEFAULT 0,
+        capacity INTEGER NOT NULL DEFAULT 0,
+        seats_sold INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (salle, day)
+    );
+    CREATE INDEX IF NOT EXISTS rollup_salles_daily_day ON rollup_salles_daily(day);
+
+    -- Dernier identifiant de réservation intégré dans les agrégats
+    CREATE TABLE IF NOT EXISTS rollup_state (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    );
+    INSERT OR IGNORE INTO rollup_state (name, value) VALUES ('reservations_high_water', 0);
+
+    CREATE TRIGGER IF NOT EXISTS rollup_seance_insert AFTER INSERT ON seances
+    BEGIN
+        INSERT INTO rollup_seances (seance_id, film_id, salle, day, capacity)
+        VALUES (NEW.id, NEW.film_id, NEW.salle, substr(NEW.horaire, 1, 10),
+                COALESCE((SELECT capacity FROM salles WHERE number = NEW.salle), 0));
+        INSERT INTO rollup_films_daily (film_id, day, seances, capacity)
+        SELECT film_id, day, 1, capacity FROM rollup_seances WHERE seance_id = NEW.id
+        ON CONFLICT(film_id, day) DO UPDATE SET
+            seances = seances + 1, capacity = capacity + excluded.capacity;
+        INSERT INTO rollup_salles_daily (salle, day, seances, capacity)
+        SELECT salle, day, 1, capacity FROM rollup_seances WHERE seance_id = NEW.id
+        ON CONFLICT(salle, day) DO UPDATE SET
+            seances = seances + 1, capacity = capacity + excluded.capacity;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS rollup_seance_delete AFTER DELETE ON seances
+    BEGIN
+        UPDATE rollup_films_daily SET
+            seances = seances - 1,
+            capacity = capacity - (SELECT capacity FROM rollup_seances WHERE seance_id = OLD.id),
+            seats_sold = seats_sold - (SELECT seats_sold FROM rollup_seances WHERE seance_id = OLD.id)
+        WHERE (film_id, day) = (SELECT film_id, day FROM rollup_seances WHERE seance_id = OLD.id);
+        UPDATE rollup_salles_daily SET
+            seances = seances - 1,
+            capacity = capacity - (SELECT capacity FROM rollup_seances WHERE seance_id = OLD.id),
+            seats_sold = seats_sold - (SELECT seats_sold FROM rollup_seances WHERE seance_id = OLD.id)
+        WHERE (salle, day) = (SELECT salle, day FROM rollup_seances WHERE seance_id = OLD.id);
+        DELETE FROM rollup_films_daily WHERE seances <= 0
+            AND (film_id, day) = (SELECT film_id, day FROM rollup_seances WHERE seance_id = OLD.id);
+        DELETE FROM rollup_salles_daily WHERE seances <= 0
+            AND (salle, day) = (SELECT salle, day FROM rollup_seances WHERE seance_id = OLD.id);
+        DELETE FROM rollup_seances WHERE seance_id = OLD.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS rollup_reservation_insert AFTER INSERT ON reservations
+    BEGIN
+        UPDATE rollup_seances SET
+            seats_sold = seats_sold + NEW.seats, reservations = reservations + 1
+        WHERE seance_id = NEW.seance_id;
+        UPDATE rollup_films_daily SET seats_sold = seats_sold + NEW.seats
+        WHERE (film_id, day) = (SELECT film_id, day FROM rollup_seances WHERE seance_id = NEW.seance_id);
+        UPDATE rollup_salles_daily SET seats_sold = seats_sold + NEW.seats
+        WHERE (salle, day) = (SELECT salle, day FROM rollup_seances WHERE seance_id = NEW.seance_id);
+        UPDATE rollup_state SET value = NEW.id
+        WHERE name = 'reservations_high_water' AND value < NEW.id;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS rollup_reservation_delete AFTER DELETE ON reservations
+    BEGIN
+        UPDATE rollup_seances SET
+            seats_sold = seats_sold - OLD.seats, reservations = reservations - 1
+        WHERE seance_id = OLD.seance_id;
+        UPDATE rollup_films_daily SET seats_sold = seats_sold - OLD.seats
+        WHERE (film_id, day) = (SELECT film_id, day FROM rollup_seances WHERE seance_id = OLD.seance_id);
+        UPDATE rollup_salles_daily SET seats_sold = seats_sold - OLD.seats
+        WHERE (salle, day) = (SELECT salle, day FROM rollup_seances WHERE seance_id = OLD.seance_id);
+    END;
+'''
+
+# Rattrapage : intègre les séances absentes et les réservations au-delà du marqueur.
+# Les agrégats journaliers sont ensuite recalculés à partir des séances (pas des réservations).
+CATCH_UP = '''
+    CREATE TEMP TABLE IF NOT EXISTS rollup_marks (old INTEGER, new INTEGER);
+    DELETE FROM rollup_marks;
+    INSERT INTO rollup_marks
+    SELECT value, (SELECT COALESCE(MAX(id), 0) FROM reservations)
+    FROM rollup_state WHERE name = 'reservations_high_water';
+
+    INSERT INTO rollup_seances (seance_id, film_id, salle, day, capacity, seats_sold, reservations)
+    SELECT s.id, s.film_id, s.salle, substr(s.horaire, 1, 10),
+           COALESCE((SELECT capacity FROM salles WHERE number = s.salle), 0),
+           (SELECT COALESCE(SUM(seats), 0) FROM reservations r
+            WHERE r.seance_id = s.id AND r.id <= (SELECT old FROM rollup_marks)),
+           (SELECT COUNT(*) FROM reservations r
+            WHERE r.seance_id = s.id AND r.id <= (SELECT old FROM rollup_marks))
+    FROM seances s
+    WHERE s.id NOT IN (SELECT seance_id FROM rollup_seances);
+
+    UPDATE rollup_seances SET
+        seats_sold = seats_sold + (
+            SELECT COALESCE(SUM(seats), 0) FROM reservations r
+            WHERE r.seance_id = rollup_seances.seance_id
+              AND r.id > (SELECT old FROM rollup_marks) AND r.id <= (SELECT new FROM rollup_marks)),
+        reservations = reservations + (
+            SELECT COUNT(*) FROM reservations r
+            WHERE r.seance_id = rollup_seances.seance_id
+              AND r.id > (SELECT old FROM rollup_marks) AND r.id <= (SELECT new FROM rollup_marks))
+    WHERE seance_id IN (
+        SELECT seance_id FROM reservations
+        WHERE id > (SELECT old FROM rollup_marks) AND id <= (SELECT new FROM rollup_marks));
+
+    DELETE FROM rollup_films_daily;
+    INSERT INTO rollup_films_daily (film_id, day, seances, capacity, seats_sold)
+    SELECT film_id, day, COUNT(*), SUM(capacity), SUM(seats_sold)
+    FROM rollup_seances GROUP BY film_id, day;
+
+    DELETE FROM rollup_salles_daily;
+    INSERT INTO rollup_salles_daily (salle, day, seances, capacity, seats_sold)
+    SELECT salle, day, COUNT(*), SUM(capacity), SUM(seats_sold)
+    FROM rollup_seances GROUP BY salle, day;
+
+    UPDATE rollup_state SET value = MAX(value, (SELECT new FROM rollup_marks))
+    WHERE name = 'reservations_high_water';
+'''
+
+
+# Installe les agrégats et rattrape l'historique, dans une seule transaction
+def init_rollups(path):
+    """Crée les tables et triggers d'agrégats puis intègre les réservations manquantes"""
+    conn = sqlite3.connect(path)
+    # BEGIN IMMEDIATE : aucune réservation ne peut passer entre l'installation et le rattrapage
+    conn.executescript('BEGIN IMMEDIATE;' + ROLLUP_SCHEMA + CATCH_UP + 'COMMIT;')
+    conn.close()
+
+
+# Intègre les séances et réservations non encore comptabilisées
+def catch_up(conn):
+    """Met à jour les agrégats à partir du marqueur de la dernière réservation intégrée"""
+    conn.executescript('BEGIN IMMEDIATE;' + CATCH_UP + 'COMMIT;')
+
+
+# Recalcule tous les agrégats depuis zéro
+def rebuild(conn):
+    """Vide les agrégats, remet le marqueur à zéro et recalcule tout l'historique"""
+    conn.executescript('''
+        BEGIN IMMEDIATE;
+        DELETE FROM rollup_seances;
+        UPDATE rollup_state SET value = 0 WHERE name = 'reservations_high_water';
+    ''' + CATCH_UP + 'COMMIT;')
+
+
+# Taux de remplissage en pourcentage
+def occupancy(seats_sold, capacity):
+    """Retourne le pourcentage de places vendues, arrondi à 0,1"""
+    return round(100.0 * seats_sold / capacity, 1) if capacity else 0.0
+
+
+# Lit la période demandée (?from=YYYY-MM-DD&to=YYYY-MM-DD)
+def date_range():
+    """Retourne (début, fin) de la période, ou lève ValueError avec le message d'erreur"""
+    today = date.today()
+    start = request.args.get('from') or (today - timedelta(days=DEFAULT_WINDOW_DAYS)).isoformat()
+    end = request.args.get('to') or (today + timedelta(days=DEFAULT_WINDOW_DAYS)).isoformat()
+    try:
+        # isoformat() normalise les dates (2024-1-5 -> 2024-01-05) pour les comparaisons de texte
+        start = datetime.strptime(start, "%Y-%m-%d").date().isoformat()
+        end = datetime.strptime(end, "%Y-%m-%d").date().isoformat()
+    except ValueError:
+        raise ValueError('Format de date invalide. Format attendu : YYYY-MM-DD')
+    if start > end:
+        raise ValueError('La date de début doit précéder la date de fin.')
+    return start, end
+
+
+# Vérifie le rôle admin et la période
+def check_request():
+    """Retourne (période, None) si la requête est valide, sinon (None, réponse d'erreur)"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return None, (jsonify({'message': 'Accès refusé. Réservé aux administrateurs.'}), 403)
+    try:
+        return date_range(), None
+    except ValueError as e:
+        return None, (jsonify({'message': str(e)}), 400)
+
+
+# Route API : remplissage d'une séance
+@bp.route('/api/analytics/seances/<int:seance_id>', methods=['GET'])
+def seance_occupancy(seance_id):
+    """Retourne les places vendues et le taux de remplissage d'une séance"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return jsonify({'message': 'Accès refusé. Réservé aux administrateurs.'}), 403
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT seance_id, film_id, salle, day, capacity, seats_sold, reservations
+        FROM rollup_seances WHERE seance_id = ?
+    ''', (seance_id,))
+    row = cursor.fetchone()
+    conn.close()
+    if not row:
+        return jsonify({'message': 'Séance introuvable.'}), 404
+
+    return jsonify({
+        'seance_id': row[0],
+        'film_id': row[1],
+        'salle': row[2],
+        'day': row[3],
+        'capacity': row[4],
+        'seats_sold': row[5],
+        'reservations': row[6],
+        'occupancy': occupancy(row[5], row[4])
+    }), 200
+
+
+# Route API : taux de remplissage jour par jour
+@bp.route('/api/analytics/occupancy', methods=['GET'])
+def daily_occupancy():
+    """Retourne, pour chaque jour de la période, les places vendues et le taux de remplissage"""
+    period, error = check_request()
+    if error:
+        return error
+    start, end = period
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT day, SUM(seances), SUM(capacity), SUM(seats_sold)
+        FROM rollup_salles_daily
+        WHERE day BETWEEN ? AND ?
+        GROUP BY day
+        ORDER BY day
+    ''', (start, end))
+    rows = cursor.fetchall()
+    conn.close()
+
+    days = [
+        {
+            'day': row[0],
+            'seances': row[1],
+            'capacity': row[2],
+            'seats_sold': row[3],
+            'occupancy': occupancy(row[3], row[2])
+        }
+        for row in rows
+    ]
+    return jsonify({'from': start, 'to': end, 'days': days}), 200
+
+
+# Route API : films les plus vus sur la période
+@bp.route('/api/analytics/top_films', methods=['GET'])
+def top_films():
+    """Retourne les films classés par nombre de places vendues sur la période"""
+    period, error = check_request()
+    if error:
+        return error
+    start, end = period
+    try:
+        limit = int(request.args.get('limit', 10))
+    except ValueError:
+        return jsonify({'message': 'limit doit être un entier.'}), 400
+    limit = max(1, min(limit, 100))
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT d.film_id, f.title, SUM(d.seances), SUM(d.capacity), SUM(d.seats_sold) AS sold
+        FROM rollup_films_daily d
+        JOIN films f ON f.id = d.film_id
+        WHERE d.day BETWEEN ? AND ?
+        GROUP BY d.film_id
+        ORDER BY sold DESC, f.title
+        LIMIT ?
+    ''', (start, end, limit))
+    rows = cursor.fetchall()
+    conn.close()
+
+    films = [
+        {
+            'film_id': row[0],
+            'title': row[1],
+            'seances': row[2],
+            'capacity': row[3],
+            'seats_sold': row[4],
+            'occupancy': occupancy(row[4], row[3])
+        }
+        for row in rows
+    ]
+    return jsonify({'from': start, 'to': end, 'films': films}), 200
+
+
+# Route API : utilisation des salles sur la période
+@bp.route('/api/analytics/salles', methods=['GET'])
+def room_utilisation():
+    """Retourne, pour chaque salle, le nombre de séances, les places vendues et le taux de remplissage"""
+    period, error = check_request()
+    if error:
+        return error
+    start, end = period
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+        SELECT salle, SUM(seances), SUM(capacity), SUM(seats_sold)
+        FROM rollup_salles_daily
+        WHERE day BETWEEN ? AND ?
+        GROUP BY salle
+        ORDER BY salle
+    ''', (start, end))
+    rows = cursor.fetchall()
+    conn.close()
+
+    salles = [
+        {
+            'salle': row[0],
+            'seances': row[1],
+            'capacity': row[2],
+            'seats_sold': row[3],
+            'occupancy': occupancy(row[3], row[2])
+        }
+        for row in rows
+    ]
+    return jsonify({'from': start, 'to': end, 'salles': salles}), 200
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mise à jour des agrégats de statistiques")
+    parser.add_argument('--rebuild', action='store_true', help='Recalculer tous les agrégats depuis zéro')
+    parser.add_argument('--database', help='Base SQLite (par défaut : celle de la configuration)')
+    args = parser.parse_args()
+
+    from config import Config
+    database = args.database or Config.DATABASE
+    init_rollups(database)
+    if args.rebuild:
+        conn = sqlite3.connect(database)
+        rebuild(conn)
+        conn.close()
+    print("Agrégats à jour.")
+
+
+if __name__ == '__main__':
+    main()
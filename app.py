@@ -1,11 +1,35 @@
+import csv
+import io
+import json
+import re
 import sqlite3
-from flask import Flask, request, jsonify, render_template, session
+from flask import (Flask, Blueprint, Response, current_app, request, jsonify, render_template,
+                   send_from_directory, session, stream_with_context)
 from flask_cors import CORS
+from config import Config
+from db import get_connection, init_schema
+from cache import init_cache, cached
+from film_import import FORMATS, import_films
+from posters import init_posters, poster_fields
+from reservations import MAX_IDEMPOTENCY_KEY_LENGTH, Booking, commit_bookings, init_reservations
+import seances
+import salle
+import analytics
+
+# Blueprint regroupant les routes des films et des utilisateurs
+bp = Blueprint('films', __name__)
+
+# Plus grand entier stocké par SQLite (identifiants des séances)
+SQLITE_MAX_INTEGER = 2 ** 63 - 1
 
-# Création de l'application Flask
-app = Flask(__name__)
-app.secret_key = 'change'
-CORS(app, supports_credentials=True, origins=['http://127.0.0.1:5000', 'http://localhost:5000'])
+# Nombre maximum de mots pris en compte dans une recherche
+MAX_SEARCH_TERMS = 8
+
+# Colonnes lues par film_from_row (films f, affiches p)
+FILM_COLUMNS = '''
+    f.id, f.title, f.year, f.genre, f.duration, f.classification, f.poster_url,
+    p.hash, p.extension, p.thumbnails
+'''
 
 class Films:
     """Classe représentant un film dans la base de données"""
@@ -23,25 +47,20 @@ class Films:
     # Enregistre le film dans la base de données SQLite
     def save_to_db(self):
         """Enregistre le film dans la base de données SQLite"""
-        conn = sqlite3.connect('cinema.db')
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS films (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT,
-                year INTEGER,
-                genre TEXT,
-                duration INTEGER,
-                classification TEXT,
-                poster_url TEXT
-            )
-        ''')
-        cursor.execute('''
-            INSERT INTO films (title, year, genre, duration, classification, poster_url)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (self.title, self.year, self.genre, self.duration, self.classification, self.poster_url))
-        conn.commit()
-        conn.close()
+        conn = get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute('''
+                INSERT INTO films (title, year, genre, duration, classification, poster_url)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (self.title, self.year, self.genre, self.duration, self.classification, self.poster_url))
+            # lastrowid donne l'identifiant attribué par AUTOINCREMENT
+            self.id = cursor.lastrowid
+            conn.commit()
+        finally:
+            # En cas de doublon (IntegrityError), la transaction est annulée par close() :
+            # le verrou d'écriture sur la base n'est pas gardé jusqu'au ramasse-miettes
+            conn.close()
 
 
 class Users:
@@ -57,16 +76,8 @@ class Users:
     # Enregistre l'utilisateur dans la table 'users' de la base de données
     def save_to_db(self):
         """Enregistre l'utilisateur dans la base de données"""
-        conn = sqlite3.connect('cinema.db')
+        conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE,
-                password TEXT,
-                role TEXT DEFAULT 'user'
-            )
-        ''')
         cursor.execute('''
             INSERT INTO users (username, password, role)
             VALUES (?, ?, ?)
@@ -75,7 +86,7 @@ class Users:
         conn.close()
 
 # Route pour créer un nouveau compte utilisateur
-@app.route('/register', methods=['POST'])
+@bp.route('/register', methods=['POST'])
 def register():
     """Enregistre un nouvel utilisateur dans la base de données"""
     # Récupère les données JSON de la requête
@@ -104,7 +115,7 @@ def register():
         return jsonify({'message': 'Ce nom d\'utilisateur existe déjà'}), 400
 
 # Route pour connecter un utilisateur existant
-@app.route('/login', methods=['POST'])
+@bp.route('/login', methods=['POST'])
 def login():
     """Connecte un utilisateur et crée une session"""
     data = request.get_json()
@@ -112,7 +123,7 @@ def login():
         return jsonify({'message': 'Requête invalide, JSON attendu.'}), 400
     username = data['username']
     password = data['password']
-    conn = sqlite3.connect('cinema.db')
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT id, username, password, role FROM users WHERE username = ? AND password = ?
@@ -131,7 +142,7 @@ def login():
         return jsonify({'message': 'Identifiants invalides'}), 401
 
 # Route pour vérifier si l'utilisateur est connecté
-@app.route('/check_session', methods=['GET'])
+@bp.route('/check_session', methods=['GET'])
 def check_session():
     """Vérifie si l'utilisateur a une session active"""
     if 'username' in session:
@@ -144,7 +155,7 @@ def check_session():
         return jsonify({'message': 'Aucune session active'}), 401
 
 # Route pour ajouter un film (admin uniquement)
-@app.route('/add_film', methods=['POST'])
+@bp.route('/add_film', methods=['POST'])
 def add_film():
     """Ajoute un nouveau film à la base de données (réservé aux admins)"""
     # Vérifier que l'utilisateur est admin
@@ -166,52 +177,200 @@ def add_film():
         classification=data['classification'],
         poster_url=data.get('poster_url', '')
     )
-    new_film.save_to_db()
+    try:
+        new_film.save_to_db()
+    except sqlite3.IntegrityError:
+        return jsonify({'message': 'Ce film existe déjà (même titre et même année)'}), 409
+
+    # L'affiche est copiée dans le cache local en arrière-plan
+    if new_film.poster_url:
+        current_app.extensions['posters'].ingest_url(new_film.id, new_film.poster_url)
     return jsonify({'message': 'Film added successfully'}), 201
 
+# Route pour importer un catalogue de films en masse (admin uniquement)
+@bp.route('/import_films', methods=['POST'])
+def import_films_route():
+    """Importe un fichier CSV ou JSON lines de films et renvoie la progression lot par lot"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return jsonify({'message': 'Accès refusé. Réservé aux administrateurs.'}), 403
+
+    # Le fichier est envoyé tel quel dans le corps de la requête
+    fmt = request.args.get('format')
+    if fmt is None and request.mimetype == 'text/csv':
+        fmt = 'csv'
+    elif fmt is None and request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        fmt = 'jsonl'
+    if fmt not in FORMATS:
+        return jsonify({'message': f"Format inconnu. Formats acceptés : {', '.join(FORMATS)}"}), 400
+
+    try:
+        batch_size = int(request.args.get('batch_size', current_app.config['FILM_IMPORT_BATCH_SIZE']))
+    except ValueError:
+        return jsonify({'message': 'batch_size doit être un entier.'}), 400
+    if batch_size < 1:
+        return jsonify({'message': 'batch_size doit être positif.'}), 400
+
+    # Le fichier est décodé et importé au fil de la lecture, sans être chargé en mémoire
+    text_stream = io.TextIOWrapper(io.BufferedReader(request.stream), encoding='utf-8-sig', newline='')
+
+    # Les affiches nouvelles ou modifiées de chaque lot validé sont copiées en arrière-plan
+    store = current_app.extensions['posters']
+
+    def ingest_posters(films):
+        for film_id, poster_url in films:
+            store.ingest_url(film_id, poster_url)
+
+    def generate():
+        conn = get_connection()
+        try:
+            for report in import_films(conn, text_stream, fmt, batch_size, on_posters=ingest_posters):
+                yield json.dumps(report, ensure_ascii=False) + '\n'
+        except (UnicodeDecodeError, csv.Error, sqlite3.Error) as e:
+            yield json.dumps({'done': True, 'message': f"Import interrompu : {e}"}, ensure_ascii=False) + '\n'
+        finally:
+            conn.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
 # Route pour récupérer tous les films en format JSON
-@app.route('/films', methods=['GET'])
+@bp.route('/films', methods=['GET'])
 def get_films():
     """Retourne la liste de tous les films disponibles"""
-    conn = sqlite3.connect('cinema.db')
+    return jsonify(cached('films', ('films', 'posters'), load_films)), 200
+
+# Lit le catalogue complet des films (résultat mis en cache par get_films)
+def load_films():
+    """Retourne la liste de tous les films triés par titre"""
+    conn = get_connection()
     cursor = conn.cursor()
-    cursor.execute('''
-        SELECT id, title, year, genre, duration, classification, poster_url
-        FROM films
-        ORDER BY title
+    cursor.execute(f'''
+        SELECT {FILM_COLUMNS}
+        FROM films f
+        LEFT JOIN posters p ON p.film_id = f.id
+        ORDER BY f.title
     ''')
     rows = cursor.fetchall()
     conn.close()
-    
-    films = [
-        {
-            'id': row[0],
-            'title': row[1],
-            'year': row[2],
-            'genre': row[3],
-            'duration': row[4],
-            'classification': row[5],
-            'poster_url': row[6] if len(row) > 6 else ''
-        }
-        for row in rows
-    ]
-    return jsonify(films), 200
+
+    widths = current_app.config['POSTER_THUMBNAIL_WIDTHS']
+    return [film_from_row(row, widths) for row in rows]
+
+# Convertit une ligne (FILM_COLUMNS) en dictionnaire JSON
+def film_from_row(row, widths):
+    """Retourne le dictionnaire d'un film renvoyé par l'API"""
+    return {
+        'id': row[0],
+        'title': row[1],
+        'year': row[2],
+        'genre': row[3],
+        'duration': row[4],
+        'classification': row[5],
+        **poster_fields(row[6], row[7], row[8], row[9], widths)
+    }
+
+# Route de recherche plein texte dans le catalogue
+@bp.route('/films/search', methods=['GET'])
+def search_films():
+    """Recherche des films par titre/genre (préfixes, sans accents) avec filtres et limite"""
+    # Chaque mot devient une recherche par préfixe : "dun" trouve "Dune"
+    terms = [f'"{word}"*' for word in re.findall(r'\w+', request.args.get('q', ''))[:MAX_SEARCH_TERMS]]
+    genre_terms = [f'"{word}"*' for word in re.findall(r'\w+', request.args.get('genre', ''))[:MAX_SEARCH_TERMS]]
+    if not terms and not genre_terms:
+        return jsonify({'message': 'Champ manquant: q'}), 400
+
+    # Filtre sur la colonne genre de l'index plein texte
+    match = ' AND '.join(terms + [f'genre : {term}' for term in genre_terms])
+
+    try:
+        limit = int(request.args.get('limit', 20))
+        year = int(request.args['year']) if request.args.get('year') else None
+    except ValueError:
+        return jsonify({'message': 'limit et year doivent être des entiers.'}), 400
+    limit = max(1, min(limit, 100))
+
+    conditions = ['films_fts MATCH ?']
+    filters = []
+    if year is not None:
+        conditions.append('f.year = ?')
+        filters.append(year)
+    if request.args.get('classification'):
+        conditions.append('f.classification = ?')
+        filters.append(request.args['classification'])
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    def search(expression, order, count):
+        cursor.execute(f'''
+            SELECT {FILM_COLUMNS}
+            FROM films_fts
+            JOIN films f ON f.id = films_fts.rowid
+            LEFT JOIN posters p ON p.film_id = f.id
+            WHERE {' AND '.join(conditions)}
+            ORDER BY {order}
+            LIMIT ?
+        ''', [expression] + filters + [count])
+        return cursor.fetchall()
+
+    # Classer par pertinence oblige à évaluer bm25 sur tous les résultats : au-delà
+    # d'un certain nombre (recherche trop large), on classe par paliers
+    cursor.execute('SELECT COUNT(*) FROM films_fts WHERE films_fts MATCH ?', (match,))
+    if cursor.fetchone()[0] <= current_app.config['SEARCH_RANK_MAX_MATCHES']:
+        # bm25 : plus la valeur est basse, plus le film est pertinent ; le titre pèse plus que le genre
+        rows = search(match, 'bm25(films_fts, 10.0, 1.0), f.title', limit)
+    else:
+        # D'abord les titres qui commencent par la recherche (le plus court en premier, donc
+        # le titre exact), puis les titres qui contiennent tous les mots, puis le reste ;
+        # dans les deux derniers paliers, les films les plus récemment ajoutés d'abord
+        genre_filter = [f'genre : {term}' for term in genre_terms]
+        tiers = []
+        if terms:
+            starts = [f'title : ^{terms[0]}'] + [f'title : {term}' for term in terms[1:]]
+            tiers.append((' AND '.join(starts + genre_filter), 'length(f.title), films_fts.rowid DESC'))
+            tiers.append((' AND '.join([f'title : {term}' for term in terms] + genre_filter), 'films_fts.rowid DESC'))
+        tiers.append((match, 'films_fts.rowid DESC'))
+
+        rows = []
+        seen = set()
+        for expression, order in tiers:
+            # Les paliers sont inclus les uns dans les autres : on saute les films déjà trouvés
+            for row in search(expression, order, limit + len(rows)):
+                if row[0] not in seen:
+                    seen.add(row[0])
+                    rows.append(row)
+            if len(rows) >= limit:
+                break
+        rows = rows[:limit]
+    conn.close()
+
+    widths = current_app.config['POSTER_THUMBNAIL_WIDTHS']
+    return jsonify([film_from_row(row, widths) for row in rows]), 200
 
 # Route pour mettre à jour l'affiche d'un film (réservé aux admins)
-@app.route('/update_film_poster/<int:film_id>', methods=['PUT'])
+@bp.route('/update_film_poster/<int:film_id>', methods=['PUT'])
 def update_film_poster(film_id):
-    """Met à jour l'URL de l'affiche d'un film (réservé aux admins)"""
+    """Met à jour l'affiche d'un film à partir d'une URL ou d'un fichier envoyé (réservé aux admins)"""
     # Vérifier que l'utilisateur est admin
     if 'username' not in session or session.get('role') != 'admin':
         return jsonify({'message': 'Accès refusé. Réservé aux administrateurs.'}), 403
+
+    # L'affiche peut être envoyée comme fichier (champ 'poster') ou comme URL en JSON
+    store = current_app.extensions['posters']
+    upload = request.files.get('poster')
+    if upload is not None:
+        poster_url = ''
+        poster_data = upload.read(store.max_bytes + 1)
+        try:
+            store.validate(poster_data)
+        except ValueError as e:
+            return jsonify({'message': str(e)}), 400
+    else:
+        data = request.get_json(silent=True)
+        if not data or 'poster_url' not in data:
+            return jsonify({'message': 'URL de l\'affiche manquante'}), 400
+        poster_url = data['poster_url']
     
-    data = request.get_json()
-    if not data or 'poster_url' not in data:
-        return jsonify({'message': 'URL de l\'affiche manquante'}), 400
-    
-    poster_url = data['poster_url']
-    
-    conn = sqlite3.connect('cinema.db')
+    conn = get_connection()
     cursor = conn.cursor()
     
     # Vérifier que le film existe
@@ -220,22 +379,41 @@ def update_film_poster(film_id):
         conn.close()
         return jsonify({'message': 'Film introuvable'}), 404
     
-    # Mettre à jour l'affiche
+    # Mettre à jour l'affiche ; l'ancienne copie locale n'est plus valable
     cursor.execute('UPDATE films SET poster_url = ? WHERE id = ?', (poster_url, film_id))
+    cursor.execute('DELETE FROM posters WHERE film_id = ?', (film_id,))
     conn.commit()
     conn.close()
+
+    if upload is not None:
+        store.ingest_bytes(film_id, poster_data)
+    elif poster_url:
+        store.ingest_url(film_id, poster_url)
     
     return jsonify({'message': 'Affiche mise à jour avec succès'}), 200
 
+# Route servant les affiches du cache local
+@bp.route('/posters/<path:filename>')
+def poster_file(filename):
+    """Sert une affiche locale avec un cache navigateur de longue durée"""
+    # Le nom du fichier est l'empreinte de son contenu : il ne change jamais
+    response = send_from_directory(
+        current_app.extensions['posters'].directory, filename,
+        max_age=current_app.config['POSTER_MAX_AGE']
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
 
 # Route de la page d'accueil affichant toutes les séances
-@app.route('/')
+@bp.route('/')
 def accueil():
     """Affiche la page d'accueil avec les séances disponibles"""
     return render_template('home.html')
 
 # Route de la page de gestion des films (admin uniquement)
-@app.route('/admin/films')
+@bp.route('/admin/films')
 def ajout_film():
     """Affiche la page de gestion des films (réservé aux admins)"""
     # Vérifier que l'utilisateur est admin
@@ -244,19 +422,19 @@ def ajout_film():
     return render_template('admin_films.html')
 
 # Route affichant le formulaire d'inscription
-@app.route('/register')
+@bp.route('/register')
 def inscription():
     """Affiche la page d'inscription"""
     return render_template('register.html')
 
 # Route affichant le formulaire de connexion
-@app.route('/login')
+@bp.route('/login')
 def connection():
     """Affiche la page de connexion"""
     return render_template('login.html')
 
 # Route pour déconnecter l'utilisateur
-@app.route('/logout', methods=['POST'])
+@bp.route('/logout', methods=['POST'])
 def logout():
     """Déconnecte l'utilisateur en supprimant sa session"""
     # clear() supprime toutes les données de la session
@@ -264,17 +442,31 @@ def logout():
     return jsonify({'message': 'Déconnexion réussie'}), 200
 
 # Route pour réserver des places pour une séance
-@app.route('/reserve', methods=['POST'])
+@bp.route('/reserve', methods=['POST'])
 def reserve_seat():
-    """Réserve une ou plusieurs places pour une séance (limite de 5 places par film)"""
+    """Réserve une ou plusieurs places pour une séance (limite de 5 places par film)
+
+    Avec un en-tête Idempotency-Key, une requête répétée avec la même clé
+    renvoie la réponse de la première sans réserver une seconde fois.
+    """
     if 'username' not in session:
         return jsonify({'message': 'Veuillez vous connecter pour réserver.'}), 401
 
+    key = request.headers.get('Idempotency-Key')
+    if key is not None and not 0 < len(key) <= MAX_IDEMPOTENCY_KEY_LENGTH:
+        return jsonify({'message': f"Clé d'idempotence invalide (1 à {MAX_IDEMPOTENCY_KEY_LENGTH} caractères)."}), 400
+
     data = request.get_json()
     if not data or 'seance_id' not in data:
         return jsonify({'message': 'ID de séance manquant.'}), 400
 
+    # Identifiant entier (ou chaîne de chiffres) uniquement : int() tronquerait 1.9 en séance 1
     seance_id = data['seance_id']
+    if isinstance(seance_id, str) and re.fullmatch(r'[0-9]+', seance_id):
+        seance_id = int(seance_id)
+    # Un entier hors de la plage SQLite (64 bits) ferait échouer tout le lot d'écriture groupée
+    if isinstance(seance_id, bool) or not isinstance(seance_id, int) or not 1 <= seance_id <= SQLITE_MAX_INTEGER:
+        return jsonify({'message': 'ID de séance invalide.'}), 400
     
     # int() convertit une chaîne de caractères en nombre entier
     try:
@@ -286,78 +478,29 @@ def reserve_seat():
     if seats_requested < 1 or seats_requested > 5:
         return jsonify({'message': 'Vous pouvez réserver entre 1 et 5 places maximum.'}), 400
 
-    conn = sqlite3.connect('cinema.db')
-    cursor = conn.cursor()
+    booking = Booking(session['username'], seance_id, seats_requested, key)
+    writer = current_app.extensions['reservations']
 
     try:
-        # 1. Récupérer la salle de la séance et le film
-        cursor.execute('SELECT salle, film_id FROM seances WHERE id = ?', (seance_id,))
-        seance_row = cursor.fetchone()
-        if not seance_row:
-            return jsonify({'message': 'Séance introuvable.'}), 404
-        
-        salle_number = seance_row[0]
-        film_id = seance_row[1]
-
-        # 2. Récupérer la capacité de la salle
-        cursor.execute('SELECT capacity FROM salles WHERE number = ?', (salle_number,))
-        salle_row = cursor.fetchone()
-        if not salle_row:
-            # Fallback si la salle n'est pas dans la table salles (ne devrait pas arriver si bien géré)
-            return jsonify({'message': 'Salle introuvable configuration manquante.'}), 500
-        
-        capacity = salle_row[0]
-
-        # 3. Compter les réservations actuelles
-        cursor.execute('SELECT SUM(seats) FROM reservations WHERE seance_id = ?', (seance_id,))
-        result = cursor.fetchone()
-        current_reserved = result[0] if result[0] else 0
-
-        # 4. Vérifier la disponibilité
-        if current_reserved + seats_requested > capacity:
-            remaining = capacity - current_reserved
-            return jsonify({'message': f'Complet ou places insuffisantes. Restant : {remaining}'}), 409
-
-        # 5. Récupérer l'ID utilisateur
-        cursor.execute('SELECT id FROM users WHERE username = ?', (session['username'],))
-        user_row = cursor.fetchone()
-        if not user_row:
-            return jsonify({'message': 'Utilisateur introuvable.'}), 404
-        
-        user_id = user_row[0]
-        
-        # 6. Vérifier le nombre total de places réservées par cet utilisateur pour ce film
-        cursor.execute('''
-            SELECT SUM(r.seats) 
-            FROM reservations r
-            JOIN seances s ON r.seance_id = s.id
-            WHERE r.user_id = ? AND s.film_id = ?
-        ''', (user_id, film_id))
-        
-        user_total_for_film = cursor.fetchone()[0] or 0
-        
-        if user_total_for_film + seats_requested > 5:
-            remaining_allowed = 5 - user_total_for_film
-            return jsonify({
-                'message': f'Limite dépassée : vous avez déjà {user_total_for_film} place(s) pour ce film. Maximum 5 places par film. Vous pouvez encore réserver {remaining_allowed} place(s).'
-            }), 409
-
-        # 7. Enregistrer la réservation
-        cursor.execute('''
-            INSERT INTO reservations (user_id, seance_id, seats)
-            VALUES (?, ?, ?)
-        ''', (user_id, seance_id, seats_requested))
-        
-        conn.commit()
-        return jsonify({'message': f'Réservation confirmée : {seats_requested} place(s) !'}), 201
-
+        if writer is not None:
+            # Écriture groupée : on attend le commit du lot qui contient la demande
+            result = writer.reserve(booking, current_app.config['RESERVATION_TIMEOUT'])
+            if result is None:
+                return jsonify({'message': 'Service de réservation indisponible, veuillez réessayer.'}), 503
+        else:
+            conn = get_connection()
+            try:
+                result = commit_bookings(conn, [booking], current_app.config['IDEMPOTENCY_KEY_TTL'])[0]
+            finally:
+                conn.close()
     except Exception as e:
         return jsonify({'message': f'Erreur serveur: {str(e)}'}), 500
-    finally:
-        conn.close()
+
+    headers = {'Idempotent-Replayed': 'true'} if result.replayed else None
+    return Response(result.body, status=result.status, mimetype='application/json', headers=headers)
 
 # Route affichant la page des réservations de l'utilisateur
-@app.route('/my-bookings')
+@bp.route('/my-bookings')
 def mes_reservations_page():
     """Affiche la page des réservations de l'utilisateur connecté"""
     if 'username' not in session:
@@ -365,13 +508,13 @@ def mes_reservations_page():
     return render_template('my_bookings.html')
 
 # Route API pour récupérer les réservations de l'utilisateur en JSON
-@app.route('/api/mes_reservations', methods=['GET'])
+@bp.route('/api/mes_reservations', methods=['GET'])
 def get_my_reservations():
     """Retourne la liste des réservations de l'utilisateur connecté"""
     if 'username' not in session:
         return jsonify({'message': 'Non connecté'}), 401
 
-    conn = sqlite3.connect('cinema.db')
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Récupérer l'ID utilisateur
@@ -382,6 +525,20 @@ def get_my_reservations():
         return jsonify({'message': 'Utilisateur introuvable'}), 404
     
     user_id = user_row[0]
+    conn.close()
+
+    reservations = cached(
+        ('mes_reservations', user_id),
+        ('reservations', 'seances', 'films', 'posters'),
+        lambda: load_user_reservations(user_id)
+    )
+    return jsonify(reservations), 200
+
+# Lit les réservations d'un utilisateur (résultat mis en cache par get_my_reservations)
+def load_user_reservations(user_id):
+    """Retourne les réservations d'un utilisateur avec le film et la séance"""
+    conn = get_connection()
+    cursor = conn.cursor()
 
     # On récupère les réservations avec les infos du film et de la séance
     cursor.execute('''
@@ -392,10 +549,14 @@ def get_my_reservations():
             s.salle, 
             r.seats, 
             r.timestamp,
-            f.poster_url
+            f.poster_url,
+            p.hash,
+            p.extension,
+            p.thumbnails
         FROM reservations r
         JOIN seances s ON r.seance_id = s.id
         JOIN films f ON s.film_id = f.id
+        LEFT JOIN posters p ON p.film_id = f.id
         WHERE r.user_id = ?
         ORDER BY s.horaire DESC
     ''', (user_id,))
@@ -403,6 +564,7 @@ def get_my_reservations():
     rows = cursor.fetchall()
     conn.close()
 
+    widths = current_app.config['POSTER_THUMBNAIL_WIDTHS']
     reservations = [
         {
             'id': row[0],
@@ -411,15 +573,65 @@ def get_my_reservations():
             'salle': row[3],
             'seats': row[4],
             'timestamp': row[5],
-            'poster_url': row[6] if row[6] else ''
+            **poster_fields(row[6], row[7], row[8], row[9], widths)
         }
         for row in rows
     ]
+    return reservations
+
+
+# Prépare la base et les caches une seule fois, avant le fork des workers
+def bootstrap(app):
+    """Crée le schéma et les agrégats, puis précharge les templates de l'application"""
+    init_schema(app.config['DATABASE'])
+    analytics.init_rollups(app.config['DATABASE'])
+    # Compiler les templates maintenant évite de le faire à la première requête de chaque worker
+    for name in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(name)
+
+
+# Précharge les lectures les plus fréquentes dans le cache local
+def warm_cache(app):
+    """Remplit le cache des films, salles et séances avant le fork des workers"""
+    cache = app.extensions['cache']
+    with app.test_request_context():
+        cache.check()
+        get_films()
+        salle.get_salles()
+        seances.get_seances()
+    # Chaque worker ouvrira sa propre connexion de surveillance
+    cache.close()
+
+
+# Fabrique de l'application Flask
+def create_app(config=None):
+    """Crée et configure une instance de l'application Flask
+
+    config peut être une classe de configuration ou un dictionnaire
+    de valeurs qui surchargent la configuration par défaut.
+    """
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    if isinstance(config, dict):
+        app.config.update(config)
+    elif config is not None:
+        app.config.from_object(config)
+
+    CORS(app, supports_credentials=True, origins=app.config['CORS_ORIGINS'])
+
+    app.register_blueprint(bp)
+    app.register_blueprint(seances.bp)
+    app.register_blueprint(salle.bp)
+    app.register_blueprint(analytics.bp)
+
+    bootstrap(app)
+    init_cache(app)
+    init_posters(app)
+    init_reservations(app)
+    if app.config['CACHE_ENABLED']:
+        warm_cache(app)
+    return app
 
-    return jsonify(reservations), 200
-
-import seances
-import salle
 
 if __name__ == '__main__':
-    app.run(debug=True)
\ No newline at end of file
+    create_app().run(debug=True)
\ No newline at end of file
@@ -0,0 +1,118 @@
+"""
+Benchmark du débit de /reserve : un commit par requête ou écriture groupée
+
+Crée une base temporaire, puis des clients concurrents (threads) réservent
+une place chacun à leur tour sur des séances de grande capacité. Tous les
+clients partagent un seul processus, comme les threads d'un worker gunicorn
+gthread (--threads) : l'écriture groupée regroupe les demandes d'un même
+worker, elle n'apporte rien à des workers sync (une requête à la fois). Le débit
+est limité par les fsync du disque : utilisez --dir pour placer la base sur
+le disque à mesurer (/tmp est souvent en mémoire).
+
+Usage : python benchmarks/bench_reservations.py [--clients N] [--requests N]
+        [--batch-size N] [--latency S] [--dir REPERTOIRE]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+from reservations import MAX_SEATS_PER_FILM  # noqa: E402
+
+
+# Crée les utilisateurs et assez de séances pour ne jamais atteindre la limite par film
+def populate(db_path, clients, requests):
+    """Insère un utilisateur par client et une séance par film dans une salle immense"""
+    films = requests // MAX_SEATS_PER_FILM + 1
+    conn = sqlite3.connect(db_path)
+    with conn:
+        conn.execute('INSERT INTO salles (number, capacity) VALUES (1, 1000000)')
+        conn.executemany(
+            "INSERT INTO users (username, password, role) VALUES (?, 'x', 'user')",
+            ((f'client{i}',) for i in range(clients))
+        )
+        conn.executemany(
+            "INSERT INTO films (title, year, genre, duration, classification) VALUES (?, 2000, 'Drame', 90, 'Tous publics')",
+            ((f'Film {i}',) for i in range(films))
+        )
+        conn.executemany(
+            'INSERT INTO seances (film_id, salle, horaire) VALUES (?, 1, ?)',
+            ((i + 1, f'2099-01-01 {i % 24:02d}:00') for i in range(films))
+        )
+    conn.close()
+
+
+# Lance les clients et retourne (durée totale, latences, codes HTTP)
+def run(app, clients, requests):
+    """Chaque client envoie requests réservations d'une place, l'une après l'autre"""
+    latencies = []
+    statuses = []
+    barrier = threading.Barrier(clients + 1)
+
+    def client(number):
+        http = app.test_client()
+        with http.session_transaction() as s:
+            s['username'] = f'client{number}'
+            s['role'] = 'user'
+        barrier.wait()
+        for i in range(requests):
+            t0 = time.perf_counter()
+            response = http.post('/reserve', json={'seance_id': i // MAX_SEATS_PER_FILM + 1, 'seats': 1},
+                                 headers={'Idempotency-Key': f'{number}-{i}'})
+            latencies.append(time.perf_counter() - t0)
+            statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    t0 = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - t0, latencies, statuses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clients', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=50, help='Réservations par client')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--latency', type=float, default=0.002)
+    parser.add_argument('--dir', help='Répertoire de la base temporaire (par défaut : celui du système)')
+    args = parser.parse_args()
+
+    print(f"{args.clients} clients x {args.requests} réservations")
+    for group_commit in (False, True):
+        with tempfile.TemporaryDirectory(dir=args.dir) as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            app = create_app({
+                'DATABASE': db_path,
+                'POSTER_DIR': os.path.join(tmp, 'posters'),
+                'CACHE_ENABLED': False,
+                'RESERVATION_GROUP_COMMIT': group_commit,
+                'RESERVATION_BATCH_SIZE': args.batch_size,
+                'RESERVATION_BATCH_LATENCY': args.latency,
+            })
+            populate(db_path, args.clients, args.requests)
+            elapsed, latencies, statuses = run(app, args.clients, args.requests)
+            if app.extensions['reservations'] is not None:
+                app.extensions['reservations'].shutdown()
+
+            ms = sorted(t * 1000 for t in latencies)
+            label = 'écriture groupée' if group_commit else 'un commit par requête'
+            failed = sum(1 for status in statuses if status != 201)
+            print(f"{label:<22} {len(statuses) / elapsed:8.0f} réservations/s   "
+                  f"médiane {statistics.median(ms):6.2f} ms   p99 {ms[int(len(ms) * 0.99) - 1]:7.2f} ms"
+                  f"   échecs {failed}")
+
+
+if __name__ == '__main__':
+    main()
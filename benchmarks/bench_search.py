@@ -0,0 +1,81 @@
+"""
+Benchmark de la recherche plein texte (/films/search)
+
+Crée une base temporaire avec un catalogue synthétique puis mesure la
+latence de requêtes typiques (préfixes, accents, filtres).
+
+Usage : python benchmarks/bench_search.py [--films N] [--runs N]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from app import create_app  # noqa: E402
+
+WORDS = ['amour', 'nuit', 'été', 'guerre', 'étoile', 'ombre', 'rivière', 'cité', 'dernier',
+         'secret', 'mémoire', 'voyage', 'fenêtre', 'hiver', 'lumière', 'océan', 'dune', 'matrice']
+GENRES = ['Drame', 'Comédie', 'Action', 'Science-fiction', 'Animation', 'Thriller', 'Documentaire']
+CLASSIFICATIONS = ['Tous publics', '-12', '-16', '-18']
+
+QUERIES = [
+    '?q=du',
+    '?q=etoile',
+    '?q=lumiere ocean',
+    '?q=mem&genre=drame',
+    '?q=nuit&year=1999',
+    '?q=gu&classification=-12&limit=50',
+]
+
+
+# Remplit la base avec n films au titre composé de mots aléatoires
+def populate(db_path, n):
+    """Insère n films synthétiques dans la base"""
+    rng = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    rows = (
+        (' '.join(rng.sample(WORDS, 3)).capitalize() + f' {i}', 1950 + i % 75,
+         rng.choice(GENRES), 80 + i % 100, rng.choice(CLASSIFICATIONS))
+        for i in range(n)
+    )
+    with conn:
+        conn.executemany(
+            'INSERT INTO films (title, year, genre, duration, classification) VALUES (?, ?, ?, ?, ?)',
+            rows
+        )
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--films', type=int, default=100000)
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        app = create_app({'DATABASE': db_path, 'POSTER_DIR': os.path.join(tmp, 'posters'), 'CACHE_ENABLED': False})
+        populate(db_path, args.films)
+        client = app.test_client()
+
+        print(f"{args.films} films, {args.runs} requêtes par cas")
+        for query in QUERIES:
+            timings = []
+            for _ in range(args.runs):
+                t0 = time.perf_counter()
+                response = client.get('/films/search' + query)
+                timings.append(time.perf_counter() - t0)
+            ms = sorted(t * 1000 for t in timings)
+            print(f"{query:<40} {len(response.get_json()):>3} résultats   "
+                  f"médiane {statistics.median(ms):6.2f} ms   p95 {ms[int(len(ms) * 0.95) - 1]:6.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
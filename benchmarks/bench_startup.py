@@ -0,0 +1,79 @@
+"""
+Benchmark du temps de démarrage de l'application
+
+Mesure séparément :
+- le démarrage à froid (nouvel interpréteur : imports + create_app)
+- create_app() seul dans un processus où les modules sont déjà importés
+
+Usage : python benchmarks/bench_startup.py [--runs N]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Code exécuté dans un interpréteur neuf pour mesurer le démarrage à froid
+COLD_START = '''
+import sys, time
+t0 = time.perf_counter()
+from app import create_app
+create_app({'DATABASE': sys.argv[1], 'POSTER_DIR': sys.argv[2]})
+print(time.perf_counter() - t0)
+'''
+
+
+# Affiches rangées à côté de la base temporaire, pas dans le dépôt
+def poster_dir(db_path):
+    """Retourne le répertoire des affiches associé à la base de test"""
+    return os.path.join(os.path.dirname(db_path), 'posters')
+
+
+# Affiche min / médiane / max d'une série de mesures en millisecondes
+def report(label, timings):
+    """Affiche un résumé des mesures en millisecondes"""
+    ms = [t * 1000 for t in timings]
+    print(f"{label:<28} min {min(ms):8.2f} ms   médiane {statistics.median(ms):8.2f} ms   max {max(ms):8.2f} ms")
+
+
+def bench_cold(db_path, runs):
+    """Démarrage complet dans un nouveau processus Python"""
+    timings = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', COLD_START, db_path, poster_dir(db_path)],
+            cwd=ROOT, capture_output=True, text=True, check=True
+        )
+        timings.append(float(out.stdout.strip()))
+    return timings
+
+
+def bench_factory(db_path, runs):
+    """Appel de create_app() avec les modules déjà importés"""
+    from app import create_app
+    timings = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        create_app({'DATABASE': db_path, 'POSTER_DIR': poster_dir(db_path)})
+        timings.append(time.perf_counter() - t0)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        report('démarrage à froid', bench_cold(db_path, args.runs))
+        report('create_app() (à chaud)', bench_factory(db_path, args.runs))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Cache local des lectures, cohérent entre plusieurs workers
+
+Chaque worker garde ses résultats en mémoire. Au début de chaque requête,
+PRAGMA data_version indique si un autre processus (ou une autre connexion)
+a écrit dans la base ; seulement dans ce cas on relit la table
+table_generations pour savoir quelles tables ont changé, et on n'invalide
+que les entrées qui en dépendent.
+"""
+import os
+import sqlite3
+import threading
+from flask import current_app
+
+
+class CoherentCache:
+    """Cache mémoire invalidé selon les générations des tables SQLite"""
+
+    # Prépare un cache vide pour la base donnée
+    def __init__(self, db_path):
+        """Initialise le cache pour le fichier de base de données donné"""
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._conn = None
+        self._data_version = None
+        self._generations = {}
+        # clé -> (tables dont dépend la valeur, valeur)
+        self._entries = {}
+
+    # Connexion dédiée, gardée ouverte : data_version n'a de sens que sur une même connexion
+    def _connection(self):
+        """Retourne la connexion de surveillance du processus courant"""
+        if self._pid != os.getpid():
+            # Après un fork, la connexion du parent ne doit pas être réutilisée ;
+            # les entrées préchargées sont conservées et revalidées par les générations
+            self._pid = os.getpid()
+            self._conn = None
+            self._data_version = None
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+        return self._conn
+
+    # Vérifie (une fois par requête) si d'autres connexions ont modifié la base
+    def check(self):
+        """Invalide les entrées dont une table a changé depuis la dernière vérification"""
+        with self._lock:
+            conn = self._connection()
+            version = conn.execute('PRAGMA data_version').fetchone()[0]
+            if version == self._data_version:
+                return
+            self._data_version = version
+
+            rows = conn.execute('SELECT name, generation FROM table_generations').fetchall()
+            changed = {name for name, generation in rows if self._generations.get(name) != generation}
+            self._generations = dict(rows)
+            if changed:
+                self._entries = {
+                    key: entry for key, entry in self._entries.items()
+                    if not changed.intersection(entry[0])
+                }
+
+    # Retourne la valeur en cache ou la calcule puis la mémorise
+    def get_or_compute(self, key, tables, compute):
+        """Retourne la valeur associée à key, calculée par compute() si absente
+
+        tables liste les tables lues par compute() : une écriture sur
+        l'une d'elles invalide l'entrée.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[1]
+            snapshot = tuple(self._generations.get(table) for table in tables)
+
+        value = compute()
+
+        with self._lock:
+            # Ne mémoriser que si aucune invalidation n'a eu lieu pendant le calcul
+            if snapshot == tuple(self._generations.get(table) for table in tables):
+                self._entries[key] = (frozenset(tables), value)
+        return value
+
+    # Ferme la connexion de surveillance (à faire dans le maître avant le fork)
+    def close(self):
+        """Ferme la connexion de surveillance, rouverte à la prochaine vérification"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._data_version = None
+
+    # Vide tout le cache local
+    def clear(self):
+        """Supprime toutes les entrées du cache"""
+        with self._lock:
+            self._entries = {}
+
+
+# Branche le cache sur l'application : une vérification au début de chaque requête
+def init_cache(app):
+    """Crée le cache de l'application et enregistre la vérification par requête"""
+    cache = CoherentCache(app.config['DATABASE'])
+    app.extensions['cache'] = cache
+    if app.config['CACHE_ENABLED']:
+        app.before_request(cache.check)
+    return cache
+
+
+# Raccourci utilisé par les routes
+def cached(key, tables, compute):
+    """Retourne le résultat de compute() via le cache de l'application courante"""
+    if not current_app.config['CACHE_ENABLED']:
+        return compute()
+    return current_app.extensions['cache'].get_or_compute(key, tables, compute)
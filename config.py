@@ -0,0 +1,61 @@
+"""
+Configuration de l'application du cinéma
+Les valeurs sensibles peuvent être surchargées par des variables d'environnement
+"""
+import os
+
+
+class Config:
+    """Configuration par défaut utilisée par create_app()"""
+
+    # Clé de signature des cookies de session (à définir en production)
+    SECRET_KEY = os.environ.get('CINEMA_SECRET_KEY', 'change')
+
+    # Chemin du fichier de base de données SQLite
+    DATABASE = os.environ.get('CINEMA_DATABASE', 'cinema.db')
+
+    # Origines autorisées pour les requêtes CORS avec cookies
+    CORS_ORIGINS = ['http://127.0.0.1:5000', 'http://localhost:5000']
+
+    # Cache local des lectures (films, salles, séances), invalidé via PRAGMA data_version
+    CACHE_ENABLED = True
+
+    # Nombre de films validés et insérés par transaction lors d'un import en masse
+    FILM_IMPORT_BATCH_SIZE = 1000
+
+    # Répertoire du cache local des affiches (fichiers nommés par leur empreinte SHA-256)
+    POSTER_DIR = os.environ.get('CINEMA_POSTER_DIR', 'posters')
+
+    # Fonction (url, max_bytes) -> bytes utilisée pour télécharger les affiches ; None = HTTP(S)
+    POSTER_FETCHER = None
+
+    # Largeurs des miniatures générées (la plus petite pour les listes, la plus grande pour l'accueil)
+    POSTER_THUMBNAIL_WIDTHS = (160, 400)
+
+    # Taille maximale d'une affiche téléchargée ou envoyée
+    POSTER_MAX_BYTES = 10 * 1024 * 1024
+
+    # Durée de cache navigateur des affiches locales (leur URL change avec leur contenu)
+    POSTER_MAX_AGE = 365 * 24 * 3600
+
+    # Période maximale interrogeable par la recherche de créneaux libres
+    FREE_SLOTS_MAX_DAYS = 62
+
+    # Au-delà de ce nombre de résultats, la recherche classe par paliers (titre commençant par la
+    # recherche, titre contenant tous les mots, autres) au lieu d'évaluer bm25 sur tous les résultats
+    SEARCH_RANK_MAX_MATCHES = 1000
+
+    # Durée de conservation des réponses de /reserve associées à un en-tête Idempotency-Key
+    IDEMPOTENCY_KEY_TTL = 24 * 3600
+
+    # Écriture groupée des réservations : un thread par worker valide les demandes par lots
+    RESERVATION_GROUP_COMMIT = os.environ.get('CINEMA_RESERVATION_GROUP_COMMIT') == '1'
+
+    # Nombre maximum de réservations validées par transaction en écriture groupée
+    RESERVATION_BATCH_SIZE = 64
+
+    # Attente maximale (secondes) de la première demande d'un lot avant son commit
+    RESERVATION_BATCH_LATENCY = 0.002
+
+    # Attente maximale (secondes) d'une requête /reserve en écriture groupée avant une réponse 503
+    RESERVATION_TIMEOUT = 10
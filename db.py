@@ -0,0 +1,198 @@
+"""
+Accès à la base de données SQLite du cinéma
+Centralise le schéma et l'ouverture des connexions
+"""
+import logging
+import sqlite3
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Schéma complet de la base, exécuté une seule fois au démarrage
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS films (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        title TEXT,
+        year INTEGER,
+        genre TEXT,
+        duration INTEGER,
+        classification TEXT,
+        poster_url TEXT
+    );
+
+    -- Un film est identifié par son titre et son année (dédoublonnage des imports)
+    CREATE UNIQUE INDEX IF NOT EXISTS films_title_year ON films(title, year);
+
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT,
+        role TEXT DEFAULT 'user'
+    );
+
+    CREATE TABLE IF NOT EXISTS salles (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        number INTEGER UNIQUE,
+        capacity INTEGER
+    );
+
+    CREATE TABLE IF NOT EXISTS seances (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        film_id INTEGER,
+        salle INTEGER,
+        horaire TEXT,
+        FOREIGN KEY(film_id) REFERENCES films(id)
+    );
+
+    -- Planning d'une salle trié par horaire (recherche de créneaux libres)
+    CREATE INDEX IF NOT EXISTS seances_salle_horaire ON seances(salle, horaire);
+
+    CREATE TABLE IF NOT EXISTS reservations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        seance_id INTEGER,
+        seats INTEGER DEFAULT 1,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(id),
+        FOREIGN KEY(seance_id) REFERENCES seances(id)
+    );
+
+    -- Réponse de /reserve enregistrée pour chaque clé d'idempotence (rejouée en cas de nouvel envoi)
+    CREATE TABLE IF NOT EXISTS idempotency_keys (
+        user_id INTEGER NOT NULL,
+        key TEXT NOT NULL,
+        request TEXT NOT NULL,
+        status INTEGER NOT NULL,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        PRIMARY KEY (user_id, key)
+    );
+    CREATE INDEX IF NOT EXISTS idempotency_keys_created ON idempotency_keys(created_at);
+
+    -- Affiche locale d'un film : fichier <hash>.<extension> dans le répertoire des affiches
+    CREATE TABLE IF NOT EXISTS posters (
+        film_id INTEGER PRIMARY KEY,
+        hash TEXT NOT NULL,
+        extension TEXT NOT NULL,
+        thumbnails INTEGER NOT NULL DEFAULT 0,
+        FOREIGN KEY(film_id) REFERENCES films(id)
+    );
+
+    -- Compteur de génération par table, incrémenté par les triggers ci-dessous
+    CREATE TABLE IF NOT EXISTS table_generations (
+        name TEXT PRIMARY KEY,
+        generation INTEGER NOT NULL DEFAULT 0
+    );
+'''
+
+# Tables dont les modifications invalident les caches locaux des workers
+CACHED_TABLES = ('films', 'salles', 'seances', 'reservations', 'posters')
+
+
+# Construit les triggers qui incrémentent la génération d'une table à chaque écriture
+def generation_triggers(table):
+    """Retourne le SQL des triggers de génération pour une table"""
+    sql = f"INSERT OR IGNORE INTO table_generations (name) VALUES ('{table}');\n"
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        sql += f'''
+            CREATE TRIGGER IF NOT EXISTS {table}_generation_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE table_generations SET generation = generation + 1 WHERE name = '{table}';
+            END;
+        '''
+    return sql
+
+
+# Index plein texte sur le titre et le genre des films, synchronisé par triggers.
+# remove_diacritics : « eleve » trouve « Élève » ; prefix : index des préfixes de 2 et 3 caractères
+FILMS_FTS = '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS films_fts USING fts5(
+        title, genre,
+        content='films', content_rowid='id',
+        tokenize="unicode61 remove_diacritics 2",
+        prefix='2 3'
+    );
+
+    CREATE TRIGGER IF NOT EXISTS films_fts_insert AFTER INSERT ON films
+    BEGIN
+        INSERT INTO films_fts (rowid, title, genre) VALUES (NEW.id, NEW.title, NEW.genre);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS films_fts_delete AFTER DELETE ON films
+    BEGIN
+        INSERT INTO films_fts (films_fts, rowid, title, genre) VALUES ('delete', OLD.id, OLD.title, OLD.genre);
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS films_fts_update AFTER UPDATE OF title, genre ON films
+    BEGIN
+        INSERT INTO films_fts (films_fts, rowid, title, genre) VALUES ('delete', OLD.id, OLD.title, OLD.genre);
+        INSERT INTO films_fts (rowid, title, genre) VALUES (NEW.id, NEW.title, NEW.genre);
+    END;
+'''
+
+
+# Ouvre une connexion vers la base configurée pour l'application courante
+def get_connection():
+    """Ouvre une connexion SQLite vers la base définie dans la configuration"""
+    return sqlite3.connect(current_app.config['DATABASE'])
+
+
+# Migration : les anciennes bases acceptaient deux films de même titre et même année
+def merge_duplicate_films(conn):
+    """Fusionne les films en double dans le plus ancien et retourne le nombre de doublons supprimés
+
+    Les séances (et donc les réservations) des doublons sont rattachées au
+    film conservé, qui reprend l'affiche d'un doublon s'il n'en a pas.
+    """
+    duplicates = conn.execute('''
+        SELECT f.id, k.keep, f.title, f.year, f.poster_url
+        FROM films f
+        JOIN (
+            SELECT title, year, MIN(id) AS keep FROM films
+            GROUP BY title, year HAVING COUNT(*) > 1
+        ) k ON f.title = k.title AND f.year = k.year
+        WHERE f.id <> k.keep
+        ORDER BY f.id
+    ''').fetchall()
+    has_posters = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'posters'").fetchone()
+
+    for duplicate, keep, title, year, poster_url in duplicates:
+        logger.warning("Film en double fusionné : %s (%s), id %s -> %s", title, year, duplicate, keep)
+        conn.execute('UPDATE seances SET film_id = ? WHERE film_id = ?', (keep, duplicate))
+        if poster_url:
+            conn.execute(
+                "UPDATE films SET poster_url = ? WHERE id = ? AND COALESCE(poster_url, '') = ''",
+                (poster_url, keep)
+            )
+        if has_posters:
+            conn.execute('DELETE FROM posters WHERE film_id = ?', (duplicate,))
+        conn.execute('DELETE FROM films WHERE id = ?', (duplicate,))
+    return len(duplicates)
+
+
+# Crée les tables manquantes (appelé une fois, avant le fork des workers)
+def init_schema(path):
+    """Crée toutes les tables de la base si elles n'existent pas encore"""
+    conn = sqlite3.connect(path)
+    # Le mode WAL permet aux lecteurs de plusieurs workers de ne pas bloquer l'écrivain
+    conn.execute('PRAGMA journal_mode=WAL')
+
+    # Avant de créer l'index unique (titre, année), fusionner les doublons d'une ancienne base
+    has_films = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'films'").fetchone()
+    has_index = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'films_title_year'").fetchone()
+    if has_films and not has_index:
+        with conn:
+            merge_duplicate_films(conn)
+
+    conn.executescript(SCHEMA)
+    for table in CACHED_TABLES:
+        conn.executescript(generation_triggers(table))
+
+    # À la création de l'index plein texte, y indexer les films déjà présents
+    fts_exists = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'films_fts'").fetchone()
+    conn.executescript(FILMS_FTS)
+    if not fts_exists:
+        conn.execute("INSERT INTO films_fts (films_fts) VALUES ('rebuild')")
+    conn.commit()
+    conn.close()
@@ -0,0 +1,254 @@
+"""
+Import en masse d'un catalogue de films (CSV ou JSON lines)
+
+Le fichier est lu ligne par ligne et traité par lots : chaque lot est validé,
+dédoublonné sur (titre, année) puis inséré avec executemany dans une seule
+transaction. La mémoire utilisée dépend de la taille d'un lot, pas de celle
+du fichier.
+
+Usage : python film_import.py catalogue.csv [--format csv|jsonl] [--batch-size N]
+"""
+import argparse
+import csv
+import json
+import sqlite3
+import sys
+from datetime import datetime
+
+# Formats acceptés : CSV avec en-tête, ou un objet JSON par ligne
+FORMATS = ('csv', 'jsonl')
+
+# Classifications proposées dans le formulaire d'ajout de film
+CLASSIFICATIONS = ('Tous publics', '-12', '-16', '-18')
+
+# Nombre maximum d'erreurs détaillées renvoyées par lot
+MAX_ERRORS_PER_BATCH = 100
+
+# Insère le film, ou met à jour ses informations s'il existe déjà (même titre et année)
+UPSERT_FILM = '''
+    INSERT INTO films (title, year, genre, duration, classification, poster_url)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(title, year) DO UPDATE SET
+        genre = excluded.genre,
+        duration = excluded.duration,
+        classification = excluded.classification,
+        poster_url = COALESCE(NULLIF(excluded.poster_url, ''), films.poster_url)
+'''
+
+
+# Devine le format à partir de l'extension du fichier
+def guess_format(filename):
+    """Retourne 'csv' ou 'jsonl' selon l'extension, ou None si inconnue"""
+    name = (filename or '').lower()
+    if name.endswith('.csv'):
+        return 'csv'
+    if name.endswith(('.jsonl', '.ndjson', '.json')):
+        return 'jsonl'
+    return None
+
+
+# Lit le flux texte enregistrement par enregistrement
+def iter_records(text_stream, fmt):
+    """Génère des couples (numéro de ligne, enregistrement) sans charger tout le fichier
+
+    Un enregistrement illisible est renvoyé sous forme d'exception ValueError
+    à la place du dictionnaire, pour être compté comme une erreur de ligne.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(text_stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif fmt == 'jsonl':
+        for line_number, line in enumerate(text_stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield line_number, ValueError(f"JSON invalide : {e.msg}")
+                continue
+            if not isinstance(record, dict):
+                yield line_number, ValueError("Objet JSON attendu.")
+                continue
+            yield line_number, record
+    else:
+        raise ValueError(f"Format inconnu : {fmt}. Formats acceptés : {', '.join(FORMATS)}")
+
+
+# Vérifie un enregistrement et le convertit en ligne prête à insérer
+def validate_film(record):
+    """Retourne le tuple (title, year, genre, duration, classification, poster_url)
+
+    Lève ValueError avec un message explicite si un champ est invalide.
+    """
+    for key in ('title', 'year', 'genre', 'duration', 'classification'):
+        if record.get(key) in (None, ''):
+            raise ValueError(f"Champ manquant: {key}")
+
+    title = str(record['title']).strip()
+    genre = str(record['genre']).strip()
+    if not title:
+        raise ValueError("Champ manquant: title")
+
+    try:
+        year = int(record['year'])
+    except (ValueError, TypeError):
+        raise ValueError(f"Année invalide : {record['year']}")
+    max_year = datetime.now().year + 5
+    if year < 1888 or year > max_year:
+        raise ValueError(f"Année hors limites (1888-{max_year}) : {year}")
+
+    try:
+        duration = int(record['duration'])
+    except (ValueError, TypeError):
+        raise ValueError(f"Durée invalide : {record['duration']}")
+    if duration < 1 or duration > 500:
+        raise ValueError(f"Durée hors limites (1-500 minutes) : {duration}")
+
+    classification = str(record['classification']).strip()
+    if classification not in CLASSIFICATIONS:
+        raise ValueError(f"Classification inconnue : {classification}")
+
+    poster_url = str(record.get('poster_url') or '').strip()
+    return (title, year, genre, duration, classification, poster_url)
+
+
+# Lit l'identifiant et l'affiche actuels des films d'un lot qui ont une affiche
+def current_posters(conn, rows):
+    """Retourne {(titre, année): (id, poster_url)} pour les lignes avec poster_url"""
+    found = {}
+    for row in rows:
+        if row[5]:
+            film = conn.execute(
+                'SELECT id, poster_url FROM films WHERE title = ? AND year = ?', (row[0], row[1])
+            ).fetchone()
+            if film:
+                found[(row[0], row[1])] = film
+    return found
+
+
+# Films déjà programmés dont la durée changerait : leurs séances pourraient se chevaucher
+def duration_conflicts(conn, rows):
+    """Retourne {(titre, année): durée actuelle} des films ayant des séances et une autre durée"""
+    scheduled = {film_id for film_id, in conn.execute('SELECT DISTINCT film_id FROM seances')}
+    conflicts = {}
+    if not scheduled:
+        return conflicts
+    for row in rows:
+        film = conn.execute(
+            'SELECT id, duration FROM films WHERE title = ? AND year = ?', (row[0], row[1])
+        ).fetchone()
+        if film and film[0] in scheduled and film[1] != row[3]:
+            conflicts[(row[0], row[1])] = film[1]
+    return conflicts
+
+
+# Importe le flux par lots et produit un rapport de progression après chaque lot
+def import_films(conn, text_stream, fmt, batch_size=1000, on_posters=None):
+    """Importe les films du flux et génère un rapport par lot, puis un rapport final
+
+    Chaque rapport de lot contient le nombre de lignes lues, de films importés
+    (insérés ou mis à jour), de doublons ignorés et les erreurs de ligne.
+    Un film qui a déjà des séances n'est pas mis à jour si sa durée change :
+    la ligne est signalée en erreur (les séances pourraient se chevaucher).
+    Les affiches locales des films dont poster_url change sont supprimées
+    dans la transaction du lot ; après le commit, on_posters (si donné)
+    reçoit la liste des (film_id, poster_url) nouvelles ou modifiées.
+    """
+    totals = {'read': 0, 'imported': 0, 'duplicates': 0, 'errors': 0, 'batches': 0}
+    records = iter_records(text_stream, fmt)
+
+    while True:
+        batch = {}
+        lines = {}
+        errors = []
+        read = 0
+        for line_number, record in records:
+            read += 1
+            try:
+                if isinstance(record, ValueError):
+                    raise record
+                row = validate_film(record)
+            except ValueError as e:
+                errors.append({'line': line_number, 'message': str(e)})
+            else:
+                # Dans un même lot, la dernière occurrence de (titre, année) l'emporte
+                batch[(row[0], row[1])] = row
+                lines[(row[0], row[1])] = line_number
+            if read >= batch_size:
+                break
+
+        if read == 0:
+            break
+
+        with conn:
+            for key, duration in duration_conflicts(conn, batch.values()).items():
+                errors.append({
+                    'line': lines[key],
+                    'message': f"Durée non modifiable ({duration} min) : le film a déjà des séances",
+                })
+                del batch[key]
+            errors.sort(key=lambda error: error['line'])
+
+            before = current_posters(conn, batch.values())
+            conn.executemany(UPSERT_FILM, batch.values())
+            after = current_posters(conn, batch.values())
+            changed = [film for key, film in after.items() if before.get(key) != film]
+            # L'ancienne affiche locale ne correspond plus à poster_url : on l'oublie
+            # (comme /update_film_poster), l'URL d'origine est servie en attendant la copie
+            conn.executemany('DELETE FROM posters WHERE film_id = ?', ((film[0],) for film in changed))
+        if on_posters and changed:
+            on_posters(changed)
+
+        totals['batches'] += 1
+        totals['read'] += read
+        totals['imported'] += len(batch)
+        totals['duplicates'] += read - len(errors) - len(batch)
+        totals['errors'] += len(errors)
+        yield {
+            'batch': totals['batches'],
+            'read': read,
+            'imported': len(batch),
+            'duplicates': read - len(errors) - len(batch),
+            'errors': errors[:MAX_ERRORS_PER_BATCH],
+            'total_read': totals['read'],
+        }
+
+    yield dict(totals, done=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import en masse d'un catalogue de films")
+    parser.add_argument('path', help='Fichier CSV ou JSON lines à importer')
+    parser.add_argument('--format', choices=FORMATS, help="Format du fichier (déduit de l'extension par défaut)")
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--database', help='Base SQLite (par défaut : celle de la configuration)')
+    args = parser.parse_args()
+
+    fmt = args.format or guess_format(args.path)
+    if fmt is None:
+        parser.error("Format inconnu, utilisez --format csv ou --format jsonl")
+
+    from config import Config
+    from db import init_schema
+    database = args.database or Config.DATABASE
+    init_schema(database)
+
+    conn = sqlite3.connect(database)
+    try:
+        with open(args.path, encoding='utf-8-sig', newline='') as stream:
+            for report in import_films(conn, stream, fmt, args.batch_size):
+                if report.get('done'):
+                    print(f"Terminé : {report['read']} lignes lues, {report['imported']} films importés, "
+                          f"{report['duplicates']} doublons, {report['errors']} erreurs.")
+                    print("Pour copier les affiches dans le cache local : python posters.py --backfill")
+                    break
+                for error in report['errors']:
+                    print(f"  ligne {error['line']} : {error['message']}", file=sys.stderr)
+                print(f"Lot {report['batch']} : {report['total_read']} lignes lues", file=sys.stderr)
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,304 @@
+"""
+Stockage local des affiches de films
+
+Les affiches sont téléchargées (ou reçues en upload) puis rangées sur disque
+sous le nom de l'empreinte SHA-256 de leur contenu : un même fichier n'est
+stocké qu'une fois et son URL ne change jamais, ce qui permet de le servir
+avec un cache navigateur « immutable ». Les miniatures sont calculées dans
+un pool de processus, en arrière-plan.
+
+Usage : python posters.py --backfill [--database cinema.db] [--workers N]
+        (copie les affiches des films qui pointent encore vers une URL externe)
+"""
+import argparse
+import hashlib
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+import urllib.request
+from concurrent.futures import Future, as_completed, ProcessPoolExecutor, ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Signatures des formats d'image acceptés
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+
+# Récupérateur par défaut : télécharge l'image en HTTP(S)
+def fetch_url(url, max_bytes, timeout=10):
+    """Télécharge le contenu d'une URL http(s), limité à max_bytes octets"""
+    if not url.lower().startswith(('http://', 'https://')):
+        raise ValueError(f"URL d'affiche non supportée : {url}")
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        data = response.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ValueError(f"Affiche trop volumineuse (plus de {max_bytes} octets)")
+    return data
+
+
+# Détermine l'extension à partir du contenu, pas de l'URL
+def image_extension(data):
+    """Retourne l'extension du format de l'image, ou lève ValueError si ce n'est pas une image"""
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    raise ValueError("Le fichier n'est pas une image reconnue (JPEG, PNG, GIF ou WebP)")
+
+
+# Exécuté dans un processus du pool : redimensionne l'affiche pour chaque largeur
+def make_thumbnails(directory, digest, extension, widths):
+    """Crée les miniatures JPEG <empreinte>_w<largeur>.jpg et retourne les largeurs produites"""
+    from PIL import Image
+
+    done = []
+    with Image.open(os.path.join(directory, f'{digest}.{extension}')) as image:
+        image = image.convert('RGB')
+        for width in widths:
+            target = os.path.join(directory, f'{digest}_w{width}.jpg')
+            if not os.path.exists(target):
+                thumbnail = image.copy()
+                thumbnail.thumbnail((width, width * 2))
+                tmp = f'{target}.{os.getpid()}.tmp'
+                thumbnail.save(tmp, 'JPEG', quality=85, optimize=True)
+                os.replace(tmp, target)
+            done.append(width)
+    return done
+
+
+# Construit les URLs d'affiche renvoyées par l'API pour un film
+def poster_fields(remote_url, digest, extension, thumbnails, widths):
+    """Retourne poster_url et les URLs des miniatures (locales si l'affiche est en cache)
+
+    Tant que l'affiche n'est pas en cache on renvoie l'URL d'origine ; tant
+    que les miniatures ne sont pas prêtes on renvoie l'affiche complète.
+    """
+    if not digest:
+        url = remote_url or ''
+        return {'poster_url': url, 'poster_thumb_url': url, 'poster_medium_url': url}
+    original = f'/posters/{digest}.{extension}'
+    small, medium = min(widths), max(widths)
+    return {
+        'poster_url': original,
+        'poster_thumb_url': f'/posters/{digest}_w{small}.jpg' if thumbnails else original,
+        'poster_medium_url': f'/posters/{digest}_w{medium}.jpg' if thumbnails else original,
+    }
+
+
+class PosterStore:
+    """Cache disque des affiches, adressé par le contenu"""
+
+    # Prépare le répertoire de stockage et les pools (créés à la demande)
+    def __init__(self, directory, db_path, fetcher=None, widths=(160, 400),
+                 max_bytes=10 * 1024 * 1024, fetch_workers=4, thumbnail_workers=2):
+        """Initialise le stockage des affiches dans directory"""
+        self.directory = directory
+        self.db_path = db_path
+        self.fetcher = fetcher or fetch_url
+        self.widths = tuple(widths)
+        self.max_bytes = max_bytes
+        self.fetch_workers = fetch_workers
+        self.thumbnail_workers = thumbnail_workers
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = None
+        self._processes = None
+        os.makedirs(directory, exist_ok=True)
+
+    # Les pools sont créés dans chaque worker après le fork, jamais hérités du maître
+    def _pools(self):
+        """Retourne (pool de threads, pool de processus) du processus courant"""
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._threads = ThreadPoolExecutor(max_workers=self.fetch_workers)
+                self._processes = ProcessPoolExecutor(
+                    max_workers=self.thumbnail_workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._threads, self._processes
+
+    # Télécharge l'affiche d'un film en arrière-plan
+    def ingest_url(self, film_id, url):
+        """Planifie le téléchargement de l'affiche et retourne un Future"""
+        threads, _ = self._pools()
+        return threads.submit(self._ingest_url, film_id, url)
+
+    def _ingest_url(self, film_id, url):
+        try:
+            data = self.fetcher(url, self.max_bytes)
+            return self.ingest_bytes(film_id, data, source_url=url).result()
+        except Exception:
+            logger.exception("Impossible de récupérer l'affiche du film %s (%s)", film_id, url)
+            raise
+
+    # Enregistre une affiche déjà en mémoire (upload) et lance les miniatures
+    def ingest_bytes(self, film_id, data, source_url=None):
+        """Stocke l'image, l'associe au film et retourne le Future des miniatures
+
+        Si source_url est donnée, l'affiche n'est associée au film que si
+        celui-ci pointe toujours vers cette URL (pas d'écrasement par un
+        téléchargement plus ancien). Lève ValueError si les données ne sont
+        pas une image acceptée.
+        """
+        extension = self.validate(data)
+        digest = hashlib.sha256(data).hexdigest()
+
+        path = os.path.join(self.directory, f'{digest}.{extension}')
+        if not os.path.exists(path):
+            # Écriture dans un fichier temporaire puis renommage : jamais de fichier partiel servi
+            tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, path)
+
+        ready = self._has_thumbnails(digest)
+        self._save(film_id, digest, extension, ready, source_url)
+        if ready:
+            future = Future()
+            future.set_result(list(self.widths))
+            return future
+
+        _, processes = self._pools()
+        future = processes.submit(make_thumbnails, self.directory, digest, extension, self.widths)
+        future.add_done_callback(lambda f: self._thumbnails_done(f, film_id, digest))
+        return future
+
+    # Vérifie la taille et le format d'une affiche
+    def validate(self, data):
+        """Retourne l'extension de l'image ou lève ValueError si elle est refusée"""
+        if len(data) > self.max_bytes:
+            raise ValueError(f"Affiche trop volumineuse (plus de {self.max_bytes} octets)")
+        return image_extension(data)
+
+    def _has_thumbnails(self, digest):
+        return all(
+            os.path.exists(os.path.join(self.directory, f'{digest}_w{width}.jpg'))
+            for width in self.widths
+        )
+
+    def _thumbnails_done(self, future, film_id, digest):
+        if future.exception() is not None:
+            logger.error("Miniatures non générées pour le film %s : %s", film_id, future.exception())
+            return
+        conn = sqlite3.connect(self.db_path)
+        with conn:
+            # Ne rien faire si l'affiche du film a changé entre-temps
+            conn.execute(
+                'UPDATE posters SET thumbnails = 1 WHERE film_id = ? AND hash = ?',
+                (film_id, digest)
+            )
+        conn.close()
+
+    def _save(self, film_id, digest, extension, thumbnails, source_url):
+        conn = sqlite3.connect(self.db_path)
+        try:
+            if source_url is not None:
+                row = conn.execute('SELECT poster_url FROM films WHERE id = ?', (film_id,)).fetchone()
+                if not row or row[0] != source_url:
+                    return
+            conn.execute('''
+                INSERT INTO posters (film_id, hash, extension, thumbnails)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(film_id) DO UPDATE SET
+                    hash = excluded.hash,
+                    extension = excluded.extension,
+                    thumbnails = excluded.thumbnails
+            ''', (film_id, digest, extension, int(thumbnails)))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Arrête les pools (fin de processus ou fin de test)
+    def shutdown(self, wait=True):
+        """Attend la fin des tâches en cours puis arrête les pools"""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._threads.shutdown(wait=wait)
+                self._processes.shutdown(wait=wait)
+            self._pid = None
+
+
+# Crée le stockage des affiches de l'application
+def init_posters(app):
+    """Crée le PosterStore à partir de la configuration de l'application"""
+    # Un chemin relatif est résolu par rapport à l'application, comme send_from_directory,
+    # et non par rapport au répertoire courant du processus
+    store = PosterStore(
+        os.path.join(app.root_path, app.config['POSTER_DIR']),
+        app.config['DATABASE'],
+        fetcher=app.config['POSTER_FETCHER'],
+        widths=app.config['POSTER_THUMBNAIL_WIDTHS'],
+        max_bytes=app.config['POSTER_MAX_BYTES'],
+    )
+    app.extensions['posters'] = store
+    return store
+
+
+# Films dont l'affiche n'est pas encore dans le cache local
+def films_to_backfill(conn):
+    """Retourne les (id, poster_url) des films avec une URL d'affiche mais sans affiche locale"""
+    return conn.execute('''
+        SELECT f.id, f.poster_url
+        FROM films f
+        LEFT JOIN posters p ON p.film_id = f.id
+        WHERE COALESCE(f.poster_url, '') <> '' AND p.film_id IS NULL
+        ORDER BY f.id
+    ''').fetchall()
+
+
+# Copie dans le cache local les affiches des films existants
+def backfill(store, films):
+    """Télécharge les affiches des films donnés et retourne (réussies, échouées)"""
+    futures = [store.ingest_url(film_id, url) for film_id, url in films]
+    done = failed = 0
+    for future in as_completed(futures):
+        if future.exception() is None:
+            done += 1
+        else:
+            failed += 1
+    return done, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cache local des affiches de films")
+    parser.add_argument('--backfill', action='store_true', required=True,
+                        help='Copier les affiches des films qui pointent vers une URL externe')
+    parser.add_argument('--database', help='Base SQLite (par défaut : celle de la configuration)')
+    parser.add_argument('--workers', type=int, default=8, help='Téléchargements simultanés')
+    args = parser.parse_args()
+
+    from config import Config
+    from db import init_schema
+    database = args.database or Config.DATABASE
+    init_schema(database)
+
+    conn = sqlite3.connect(database)
+    try:
+        films = films_to_backfill(conn)
+    finally:
+        conn.close()
+
+    # Même répertoire que l'application (chemin relatif au dossier du projet)
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), Config.POSTER_DIR)
+    store = PosterStore(directory, database, fetcher=Config.POSTER_FETCHER,
+                        widths=Config.POSTER_THUMBNAIL_WIDTHS, max_bytes=Config.POSTER_MAX_BYTES,
+                        fetch_workers=args.workers)
+    try:
+        print(f"{len(films)} affiches à copier...")
+        done, failed = backfill(store, films)
+        print(f"Terminé : {done} affiches copiées, {failed} échecs.")
+    finally:
+        store.shutdown()
+
+
+if __name__ == '__main__':
+    main()
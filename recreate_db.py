@@ -3,70 +3,19 @@ Script de recréation de la base de données du cinéma
 Crée toutes les tables nécessaires et insère les données par défaut
 """
 import sqlite3
+from config import Config
+from db import init_schema
 
 # Recrée toutes les tables de la base de données
 def recreate_database():
     """Recrée toutes les tables de la base de données et insère les données par défaut"""
-    conn = sqlite3.connect('cinema.db')
-    cursor = conn.cursor()
-    
     print("Recreating database...")
     
-    # Table films
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS films (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT,
-            year INTEGER,
-            genre TEXT,
-            duration INTEGER,
-            classification TEXT,
-            poster_url TEXT
-        )
-    ''')
-    
-    # Table users
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT UNIQUE,
-            password TEXT,
-            role TEXT DEFAULT 'user'
-        )
-    ''')
-    
-    # Table salles
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS salles (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            number INTEGER UNIQUE,
-            capacity INTEGER
-        )
-    ''')
-    
-    # Table seances
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS seances (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            film_id INTEGER,
-            salle INTEGER,
-            horaire TEXT,
-            FOREIGN KEY(film_id) REFERENCES films(id)
-        )
-    ''')
+    # Toutes les tables (schéma partagé avec l'application)
+    init_schema(Config.DATABASE)
 
-    # Table reservations
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS reservations (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER,
-            seance_id INTEGER,
-            seats INTEGER DEFAULT 1,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY(user_id) REFERENCES users(id),
-            FOREIGN KEY(seance_id) REFERENCES seances(id)
-        )
-    ''')
+    conn = sqlite3.connect(Config.DATABASE)
+    cursor = conn.cursor()
     
     # Créer un utilisateur administrateur par défaut
     # IntegrityError est levée si l'utilisateur existe déjà (UNIQUE constraint)
@@ -0,0 +1,371 @@
+"""
+Règles de réservation, clés d'idempotence et écriture groupée
+
+Un client peut envoyer un en-tête Idempotency-Key avec /reserve : la réponse
+est enregistrée avec la clé, dans la même transaction que la réservation. Si
+la requête est renvoyée avec la même clé (après un timeout par exemple), la
+réponse enregistrée est rejouée sans refaire les vérifications et sans
+réserver une seconde fois.
+
+Les demandes sont traitées par lots dans une transaction : les règles
+(capacité de la salle, 5 places par film) sont appliquées sur des compteurs
+en mémoire, lus dans la base au premier besoin puis mis à jour après chaque
+réservation acceptée. Sans écriture groupée, chaque requête est un lot d'une
+demande ; avec RESERVATION_GROUP_COMMIT, un thread unique regroupe les
+demandes en attente et ne fait qu'un commit (un fsync) par lot.
+"""
+import json
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+logger = logging.getLogger(__name__)
+
+# Nombre maximum de places par utilisateur et par film
+MAX_SEATS_PER_FILM = 5
+
+# Longueur maximale d'une clé d'idempotence
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# Intervalle minimal, en secondes, entre deux purges des clés expirées (par processus)
+SWEEP_INTERVAL = 60
+
+_last_sweep = 0.0
+
+# Demande de réservation ; key vaut None sans en-tête Idempotency-Key
+Booking = namedtuple('Booking', 'username seance_id seats key')
+
+# Résultat d'une demande : code HTTP, corps JSON et indicateur de réponse rejouée
+Result = namedtuple('Result', 'status body replayed')
+
+
+# Résume la requête associée à une clé, pour refuser une clé réutilisée avec un autre contenu
+def request_fingerprint(seance_id, seats):
+    """Retourne l'empreinte (texte) d'une demande de réservation"""
+    return json.dumps([str(seance_id), seats])
+
+
+class Counters:
+    """Compteurs de places d'un lot, lus à la demande dans la transaction en cours"""
+
+    # Les compteurs ne valent que pour la transaction : le verrou d'écriture est tenu
+    def __init__(self, cursor, ttl):
+        """Prépare des compteurs vides pour le curseur donné"""
+        self.cursor = cursor
+        self.ttl = ttl
+        self._users = {}
+        # seance_id -> [film_id, capacité, places réservées], ou None si introuvable
+        self._seances = {}
+        # (user_id, film_id) -> places réservées
+        self._per_film = {}
+        # (user_id, clé) -> (empreinte, code, corps) des clés traitées dans ce lot
+        self._keys = {}
+        self.reservations = []
+        self.responses = []
+
+    def user_id(self, username):
+        if username not in self._users:
+            self.cursor.execute('SELECT id FROM users WHERE username = ?', (username,))
+            row = self.cursor.fetchone()
+            self._users[username] = row[0] if row else None
+        return self._users[username]
+
+    def seance(self, seance_id):
+        if seance_id not in self._seances:
+            self.cursor.execute('''
+                SELECT s.film_id, sa.capacity,
+                       (SELECT COALESCE(SUM(r.seats), 0) FROM reservations r WHERE r.seance_id = s.id)
+                FROM seances s
+                LEFT JOIN salles sa ON sa.number = s.salle
+                WHERE s.id = ?
+            ''', (seance_id,))
+            row = self.cursor.fetchone()
+            self._seances[seance_id] = list(row) if row else None
+        return self._seances[seance_id]
+
+    def user_total(self, user_id, film_id):
+        if (user_id, film_id) not in self._per_film:
+            self.cursor.execute('''
+                SELECT SUM(r.seats)
+                FROM reservations r
+                JOIN seances s ON r.seance_id = s.id
+                WHERE r.user_id = ? AND s.film_id = ?
+            ''', (user_id, film_id))
+            self._per_film[(user_id, film_id)] = self.cursor.fetchone()[0] or 0
+        return self._per_film[(user_id, film_id)]
+
+    # Réponse déjà donnée pour une clé, dans ce lot ou dans la base
+    def stored_response(self, user_id, key):
+        if (user_id, key) in self._keys:
+            return self._keys[(user_id, key)]
+        self.cursor.execute('''
+            SELECT request, status, response FROM idempotency_keys
+            WHERE user_id = ? AND key = ? AND created_at >= ?
+        ''', (user_id, key, time.time() - self.ttl))
+        return self.cursor.fetchone()
+
+    def remember(self, user_id, key, fingerprint, status, body):
+        self._keys[(user_id, key)] = (fingerprint, status, body)
+        self.responses.append((user_id, key, fingerprint, status, body, time.time()))
+
+    def book(self, user_id, seance_id, film_id, seats):
+        self._seances[seance_id][2] += seats
+        self._per_film[(user_id, film_id)] += seats
+        self.reservations.append((user_id, seance_id, seats))
+
+    # Écrit les réservations acceptées et les réponses des clés (le commit reste à faire)
+    def flush(self):
+        """Insère en une fois les lignes accumulées pendant le lot"""
+        if self.reservations:
+            self.cursor.executemany(
+                'INSERT INTO reservations (user_id, seance_id, seats) VALUES (?, ?, ?)',
+                self.reservations
+            )
+        if self.responses:
+            # OR REPLACE : une clé expirée mais pas encore purgée est réutilisable
+            self.cursor.executemany('''
+                INSERT OR REPLACE INTO idempotency_keys (user_id, key, request, status, response, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', self.responses)
+            sweep_expired(self.cursor, self.ttl)
+
+
+# Applique les règles de réservation à une demande, sur les compteurs du lot
+def check_rules(counters, user_id, seance_id, seats):
+    """Retourne (réponse, code HTTP) ; la réservation est ajoutée au lot si le code est 201"""
+    # 1. Récupérer le film, la capacité de la salle et les places déjà réservées
+    seance = counters.seance(seance_id)
+    if seance is None:
+        return {'message': 'Séance introuvable.'}, 404
+    film_id, capacity, current_reserved = seance
+    if capacity is None:
+        # Ne devrait pas arriver si les salles sont bien configurées
+        return {'message': 'Salle introuvable configuration manquante.'}, 500
+
+    # 2. Vérifier la disponibilité
+    if current_reserved + seats > capacity:
+        remaining = capacity - current_reserved
+        return {'message': f'Complet ou places insuffisantes. Restant : {remaining}'}, 409
+
+    # 3. Vérifier le nombre total de places réservées par cet utilisateur pour ce film
+    user_total_for_film = counters.user_total(user_id, film_id)
+    if user_total_for_film + seats > MAX_SEATS_PER_FILM:
+        remaining_allowed = MAX_SEATS_PER_FILM - user_total_for_film
+        return {
+            'message': f'Limite dépassée : vous avez déjà {user_total_for_film} place(s) pour ce film. Maximum {MAX_SEATS_PER_FILM} places par film. Vous pouvez encore réserver {remaining_allowed} place(s).'
+        }, 409
+
+    # 4. Ajouter la réservation au lot
+    counters.book(user_id, seance_id, film_id, seats)
+    return {'message': f'Réservation confirmée : {seats} place(s) !'}, 201
+
+
+# Traite une demande : rejoue la réponse d'une clé connue, sinon applique les règles
+def handle(counters, booking):
+    """Retourne le Result d'une demande de réservation"""
+    user_id = counters.user_id(booking.username)
+    if user_id is None:
+        return Result(404, json.dumps({'message': 'Utilisateur introuvable.'}), False)
+
+    fingerprint = request_fingerprint(booking.seance_id, booking.seats)
+    if booking.key is not None:
+        stored = counters.stored_response(user_id, booking.key)
+        if stored:
+            stored_request, status, body = stored
+            if stored_request != fingerprint:
+                message = "Clé d'idempotence déjà utilisée pour une autre réservation."
+                return Result(422, json.dumps({'message': message}), False)
+            return Result(status, body, True)
+
+    payload, status = check_rules(counters, user_id, booking.seance_id, booking.seats)
+    body = json.dumps(payload)
+    # Les erreurs serveur ne sont pas mémorisées : un nouvel envoi pourra réussir
+    if booking.key is not None and status < 500:
+        counters.remember(user_id, booking.key, fingerprint, status, body)
+    return Result(status, body, False)
+
+
+# Traite un lot de demandes dans une seule transaction
+def commit_bookings(conn, bookings, ttl):
+    """Retourne la liste des Result, dans l'ordre des demandes, une fois le lot validé
+
+    Lève l'exception de la base si le lot n'a pas pu être validé : aucune
+    des réservations du lot n'est alors enregistrée.
+    """
+    cursor = conn.cursor()
+    # Verrou d'écriture dès le début : les compteurs lus restent exacts jusqu'au commit
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        counters = Counters(cursor, ttl)
+        results = []
+        for booking in bookings:
+            try:
+                results.append(handle(counters, booking))
+            except Exception as e:
+                # Une demande invalide ne fait pas échouer les autres demandes du lot
+                # (handle ne modifie les compteurs qu'une fois toutes les vérifications passées)
+                results.append(Result(500, json.dumps({'message': f'Erreur serveur: {e}'}), False))
+        counters.flush()
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return results
+
+
+# Supprime les clés expirées, au plus une fois par SWEEP_INTERVAL
+def sweep_expired(cursor, ttl, force=False):
+    """Supprime les clés plus anciennes que ttl secondes et retourne leur nombre"""
+    global _last_sweep
+    now = time.time()
+    if not force and now - _last_sweep < SWEEP_INTERVAL:
+        return 0
+    _last_sweep = now
+    cursor.execute('DELETE FROM idempotency_keys WHERE created_at < ?', (now - ttl,))
+    return cursor.rowcount
+
+
+class GroupCommitWriter:
+    """Thread d'écriture unique qui valide les réservations par lots"""
+
+    # Le thread et sa connexion sont créés au premier envoi, dans chaque worker
+    def __init__(self, db_path, ttl, max_batch_size=64, max_latency=0.002):
+        """Initialise l'écrivain pour la base db_path
+
+        max_latency est le temps maximal (en secondes) pendant lequel la
+        première demande d'un lot attend les suivantes. Une demande seule
+        dans la file n'attend jamais : on n'attend que si d'autres demandes
+        sont déjà arrivées pendant le commit précédent (charge concurrente).
+        """
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+        self._thread = None
+
+    # Un thread n'est pas hérité par fork : on le (re)crée dans le processus courant,
+    # et on le relance s'il s'est arrêté sur une erreur (les demandes en file sont gardées)
+    def _current_queue(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                if self._thread is not None:
+                    logger.warning("Thread d'écriture des réservations arrêté, redémarrage")
+                self._thread = threading.Thread(
+                    target=self._run, args=(self._queue,), name='reservations-writer', daemon=True
+                )
+                self._thread.start()
+            return self._queue
+
+    # Ajoute une demande à la file
+    def submit(self, booking):
+        """Retourne un Future qui recevra le Result de la demande après le commit de son lot"""
+        future = Future()
+        self._current_queue().put((booking, future))
+        return future
+
+    # Envoie une demande et attend son résultat au plus timeout secondes
+    def reserve(self, booking, timeout):
+        """Retourne le Result de la demande, ou None si elle n'a pas été traitée à temps
+
+        Une demande encore en file est annulée : elle ne sera pas réservée.
+        Si son lot est déjà en cours de validation, on attend encore au plus
+        timeout secondes ; au-delà, None est renvoyé mais la réservation peut
+        avoir été enregistrée (un nouvel envoi avec la même Idempotency-Key le dira).
+        """
+        future = self.submit(booking)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            if future.cancel():
+                return None
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+
+    # Prend les demandes en file, puis attend les suivantes s'il y a de la concurrence
+    def _collect(self, pending):
+        batch = [pending.get()]
+        deadline = time.monotonic() + self.max_latency
+        waiting = False
+        while batch[-1] is not None and len(batch) < self.max_batch_size:
+            try:
+                timeout = deadline - time.monotonic()
+                if waiting and timeout > 0:
+                    batch.append(pending.get(timeout=timeout))
+                else:
+                    batch.append(pending.get_nowait())
+                    # Plusieurs demandes en file : d'autres vont probablement suivre
+                    waiting = True
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        try:
+            conn = sqlite3.connect(self.db_path)
+        except Exception:
+            # Le thread s'arrête ; il sera relancé au prochain envoi
+            logger.exception("Connexion impossible pour l'écriture des réservations")
+            return
+        try:
+            while True:
+                batch = self._collect(pending)
+                stop = batch[-1] is None
+                batch = [item for item in batch if item is not None]
+                if batch:
+                    self._commit(conn, batch)
+                if stop:
+                    break
+        finally:
+            conn.close()
+
+    def _commit(self, conn, batch):
+        # Les demandes annulées (délai dépassé côté requête) ne sont pas traitées
+        batch = [(booking, future) for booking, future in batch if future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            results = commit_bookings(conn, [booking for booking, _ in batch], self.ttl)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        else:
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    # Arrête le thread après avoir traité les demandes déjà en file
+    def shutdown(self):
+        """Vide la file puis arrête le thread d'écriture du processus courant"""
+        with self._lock:
+            if self._pid == os.getpid():
+                self._queue.put(None)
+                self._thread.join()
+            self._pid = None
+
+
+# Crée l'écrivain groupé de l'application si le mode est activé
+def init_reservations(app):
+    """Crée le GroupCommitWriter à partir de la configuration, ou None si désactivé"""
+    writer = None
+    if app.config['RESERVATION_GROUP_COMMIT']:
+        writer = GroupCommitWriter(
+            app.config['DATABASE'],
+            app.config['IDEMPOTENCY_KEY_TTL'],
+            max_batch_size=app.config['RESERVATION_BATCH_SIZE'],
+            max_latency=app.config['RESERVATION_BATCH_LATENCY'],
+        )
+    app.extensions['reservations'] = writer
+    return writer
@@ -1,6 +1,10 @@
 import sqlite3
-from flask import request, jsonify, render_template
-from app import app
+from flask import Blueprint, request, jsonify, render_template
+from db import get_connection
+from cache import cached
+
+# Blueprint regroupant les routes des salles
+bp = Blueprint('salles', __name__)
 
 class Room:
     """Classe représentant une salle de cinéma"""
@@ -14,17 +18,9 @@ class Room:
     # Enregistre la salle dans la base de données
     def save_to_db(self):
         """Enregistre la salle dans la base de données"""
-        conn = sqlite3.connect('cinema.db')
+        conn = get_connection()
         cursor = conn.cursor()
 
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS salles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                number INTEGER,
-                capacity INTEGER
-            )
-        ''')
-
         cursor.execute('''
             INSERT INTO salles (number, capacity)
             VALUES (?, ?)
@@ -34,7 +30,7 @@ class Room:
         conn.close()
 
 # Route pour ajouter une nouvelle salle dans le cinéma
-@app.route('/add_room', methods=['POST'])
+@bp.route('/add_room', methods=['POST'])
 def add_room():
     """Ajoute une nouvelle salle dans la base de données"""
     data = request.get_json()
@@ -54,15 +50,8 @@ def add_room():
         return jsonify({'message': 'number et capacity doivent être des entiers.'}), 400
 
     try:
-        with sqlite3.connect('cinema.db') as conn:
+        with get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS salles (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    number INTEGER UNIQUE,
-                    capacity INTEGER
-                )
-            ''')
             cursor.execute("SELECT * FROM salles WHERE number = ?", (number,))
             if cursor.fetchone():
                 return jsonify({'message': f"La salle numéro {number} existe déjà."}), 409
@@ -76,10 +65,15 @@ def add_room():
         return jsonify({'message': 'Erreur base de données', 'error': str(e)}), 500
 
 # Route API pour récupérer toutes les salles en format JSON
-@app.route('/salles', methods=['GET'])
+@bp.route('/salles', methods=['GET'])
 def get_salles():
     """Retourne la liste de toutes les salles disponibles"""
-    conn = sqlite3.connect('cinema.db')
+    return jsonify(cached('salles', ('salles',), load_salles)), 200
+
+# Lit toutes les salles (résultat mis en cache par get_salles)
+def load_salles():
+    """Retourne la liste de toutes les salles triées par numéro"""
+    conn = get_connection()
     cursor = conn.cursor()
     cursor.execute('''
         SELECT id, number, capacity
@@ -88,7 +82,7 @@ def get_salles():
     ''')
     rows = cursor.fetchall()
     conn.close()
-    
+
     salles = [
         {
             'id': row[0],
@@ -97,4 +91,4 @@ def get_salles():
         }
         for row in rows
     ]
-    return jsonify(salles), 200
+    return salles
@@ -1,9 +1,13 @@
 # seances.py
-import sqlite3
-from flask import request, jsonify, render_template, session
+from flask import Blueprint, current_app, request, jsonify, render_template, session
 # datetime permet de manipuler les dates et heures
 from datetime import datetime, timedelta
-from app import app
+from db import get_connection
+from cache import cached
+from posters import poster_fields
+
+# Blueprint regroupant les routes des séances
+bp = Blueprint('seances', __name__)
 
 class Seance:
     """Classe représentant une séance de cinéma"""
@@ -24,20 +28,9 @@ class Seance:
     # Enregistre la séance après avoir vérifié qu'il n'y a pas de conflit d'horaire
     def save_to_db(self):
         """Enregistre la séance dans la base de données après vérifications"""
-        conn = sqlite3.connect('cinema.db')
+        conn = get_connection()
         cursor = conn.cursor()
 
-        # Création de la table si elle n'existe pas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS seances (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                film_id INTEGER,
-                salle INTEGER,
-                horaire TEXT,
-                FOREIGN KEY(film_id) REFERENCES films(id)
-            )
-        ''')
-
         # Vérifier que le film existe et récupérer sa durée
         cursor.execute('SELECT title, duration FROM films WHERE id = ?', (self.film_id,))
         # fetchone() récupère une seule ligne du résultat
@@ -94,7 +87,7 @@ class Seance:
 
 
 # Route pour ajouter une nouvelle séance (admin uniquement)
-@app.route('/add_seance', methods=['POST'])
+@bp.route('/add_seance', methods=['POST'])
 def add_seance():
     """Ajoute une nouvelle séance après vérification (réservé aux admins)"""
     # Vérifier que l'utilisateur est admin
@@ -115,9 +108,7 @@ def add_seance():
         salle = int(data['salle'])
     except (ValueError, TypeError):
         return jsonify({'message': 'Numéro de salle invalide.'}), 400
-        
-    if salle < 1 or salle > 5:
-        return jsonify({'message': 'La salle doit être entre 1 et 5.'}), 400
+    # L'existence de la salle (table salles) est vérifiée par Seance.save_to_db
 
     # Construire l'horaire complet à partir de date et horaire
     if 'date' in data and 'horaire' in data:
@@ -154,10 +145,15 @@ def add_seance():
 # Route Flask : liste des séances (API JSON)
 
 # Route API pour récupérer toutes les séances avec calcul des places disponibles
-@app.route('/api/seances', methods=['GET'])
+@bp.route('/api/seances', methods=['GET'])
 def get_seances():
     """Retourne la liste de toutes les séances avec places disponibles"""
-    conn = sqlite3.connect('cinema.db')
+    return jsonify(cached('seances', ('seances', 'films', 'salles', 'reservations', 'posters'), load_seances)), 200
+
+# Lit toutes les séances avec leurs places restantes (résultat mis en cache par get_seances)
+def load_seances():
+    """Retourne la liste de toutes les séances avec places disponibles"""
+    conn = get_connection()
     cursor = conn.cursor()
 
     # Requête complexe avec plusieurs JOIN pour récupérer toutes les infos nécessaires
@@ -170,15 +166,20 @@ def get_seances():
             s.horaire, 
             f.poster_url,
             sa.capacity,
-            (SELECT COALESCE(SUM(r.seats), 0) FROM reservations r WHERE r.seance_id = s.id) as reserved_seats
+            (SELECT COALESCE(SUM(r.seats), 0) FROM reservations r WHERE r.seance_id = s.id) as reserved_seats,
+            p.hash,
+            p.extension,
+            p.thumbnails
         FROM seances s
         JOIN films f ON s.film_id = f.id
         JOIN salles sa ON s.salle = sa.number
+        LEFT JOIN posters p ON p.film_id = f.id
         ORDER BY s.horaire
     ''')
     rows = cursor.fetchall()
     conn.close()
 
+    widths = current_app.config['POSTER_THUMBNAIL_WIDTHS']
     seances = []
     for row in rows:
         capacity = row[5]
@@ -190,16 +191,152 @@ def get_seances():
             'film': row[1], 
             'salle': row[2], 
             'horaire': row[3],
-            'poster_url': row[4] if row[4] else '',
+            **poster_fields(row[4], row[7], row[8], row[9], widths),
             'capacity': capacity,
             'remaining': remaining
         })
-        
-    return jsonify(seances), 200
+    return seances
+
+
+# Calcule les créneaux libres d'une salle à partir de ses séances triées
+def free_windows(busy, duration, debut, fin, buffer=0):
+    """Retourne les fenêtres (premier début, dernier début) où un film de duration minutes peut commencer
+
+    busy est la liste des séances (début, fin) de la salle triée par début ;
+    debut et fin bornent l'heure de début recherchée. Un film doit finir
+    buffer minutes avant la séance suivante et commencer buffer minutes
+    après la précédente (temps de nettoyage).
+    """
+    duree = timedelta(minutes=duration)
+    marge = timedelta(minutes=buffer)
+    windows = []
+    # Début du créneau libre courant : on balaie les séances dans l'ordre chronologique
+    libre_depuis = debut
+    for debut2, fin2 in busy:
+        occupe_debut = debut2 - marge
+        if occupe_debut - duree >= libre_depuis:
+            windows.append((libre_depuis, min(occupe_debut - duree, fin)))
+        libre_depuis = max(libre_depuis, fin2 + marge)
+        if libre_depuis > fin:
+            return windows
+    windows.append((libre_depuis, fin))
+    return windows
+
+
+# Route API pour trouver les horaires possibles d'un film dans chaque salle (admin uniquement)
+@bp.route('/api/free_slots', methods=['GET'])
+def get_free_slots():
+    """Retourne, par salle, les fenêtres d'horaires où le film peut être programmé sans chevauchement"""
+    if 'username' not in session or session.get('role') != 'admin':
+        return jsonify({'message': 'Accès refusé. Réservé aux administrateurs.'}), 403
+
+    for key in ('film_id', 'from', 'to'):
+        if key not in request.args:
+            return jsonify({'message': f"Champ manquant : {key}"}), 400
+
+    try:
+        film_id = int(request.args['film_id'])
+        buffer = int(request.args.get('buffer', 0))
+        step = int(request.args['step']) if 'step' in request.args else None
+        salles_demandees = [int(n) for n in request.args['salles'].split(',')] if request.args.get('salles') else None
+    except ValueError:
+        return jsonify({'message': 'film_id, buffer, step et salles doivent être des entiers.'}), 400
+    if buffer < 0 or buffer > 240:
+        return jsonify({'message': 'Le temps de nettoyage doit être entre 0 et 240 minutes.'}), 400
+    if step is not None and (step < 1 or step > 240):
+        return jsonify({'message': 'Le pas doit être entre 1 et 240 minutes.'}), 400
+
+    try:
+        jour_debut = datetime.strptime(request.args['from'], "%Y-%m-%d")
+        jour_fin = datetime.strptime(request.args['to'], "%Y-%m-%d")
+    except ValueError:
+        return jsonify({'message': 'Format de date invalide. Format attendu : YYYY-MM-DD'}), 400
+    if jour_fin < jour_debut or (jour_fin - jour_debut).days > current_app.config['FREE_SLOTS_MAX_DAYS']:
+        return jsonify({'message': f"Période invalide (au plus {current_app.config['FREE_SLOTS_MAX_DAYS']} jours)."}), 400
+
+    # Horaires de début possibles : de from 00:00 à to 23:59, et jamais dans le passé
+    maintenant = datetime.now().replace(second=0, microsecond=0) + timedelta(minutes=1)
+    debut = max(jour_debut, maintenant)
+    fin = jour_fin + timedelta(hours=23, minutes=59)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    cursor.execute('SELECT duration FROM films WHERE id = ?', (film_id,))
+    film = cursor.fetchone()
+    if not film:
+        conn.close()
+        return jsonify({'message': f"Film ID {film_id} inexistant."}), 404
+    duree_film = film[0]
+
+    cursor.execute('SELECT number FROM salles ORDER BY number')
+    salles_existantes = [row[0] for row in cursor.fetchall()]
+    if salles_demandees is None:
+        salles_demandees = salles_existantes
+    else:
+        # Une salle inconnue serait entièrement libre, mais add_seance la refuserait
+        inconnues = sorted(set(salles_demandees) - set(salles_existantes))
+        if inconnues:
+            conn.close()
+            return jsonify({'message': f"Salle(s) inexistante(s) : {', '.join(map(str, inconnues))}"}), 404
+
+    # Une séance commencée la veille peut encore occuper la salle, une séance du lendemain peut gêner la fin du film
+    borne_basse = (jour_debut - timedelta(days=1)).strftime("%Y-%m-%d %H:%M")
+    borne_haute = (jour_fin + timedelta(days=2)).strftime("%Y-%m-%d %H:%M")
+
+    resultat = []
+    for numero in salles_demandees:
+        # L'index (salle, horaire) renvoie directement le planning trié de la salle
+        cursor.execute('''
+            SELECT seances.horaire, films.duration
+            FROM seances
+            JOIN films ON seances.film_id = films.id
+            WHERE seances.salle = ? AND seances.horaire >= ? AND seances.horaire < ?
+            ORDER BY seances.horaire
+        ''', (numero, borne_basse, borne_haute))
+        busy = []
+        for horaire, duree in cursor.fetchall():
+            debut2 = datetime.strptime(horaire, "%Y-%m-%d %H:%M")
+            busy.append((debut2, debut2 + timedelta(minutes=duree)))
+
+        fenetres = [(a, b) for a, b in free_windows(busy, duree_film, debut, fin, buffer) if a <= b]
+        salle_info = {
+            'salle': numero,
+            'windows': [
+                {'earliest': a.strftime("%Y-%m-%d %H:%M"), 'latest': b.strftime("%Y-%m-%d %H:%M")}
+                for a, b in fenetres
+            ]
+        }
+        if step is not None:
+            salle_info['starts'] = [h.strftime("%Y-%m-%d %H:%M") for h in aligned_starts(fenetres, step)]
+        resultat.append(salle_info)
+    conn.close()
+
+    return jsonify({
+        'film_id': film_id,
+        'duration': duree_film,
+        'buffer': buffer,
+        'from': request.args['from'],
+        'to': request.args['to'],
+        'salles': resultat
+    }), 200
+
+
+# Énumère les horaires de début alignés sur un pas (ex : toutes les 15 minutes)
+def aligned_starts(fenetres, step):
+    """Génère les horaires multiples de step minutes (depuis minuit) contenus dans les fenêtres"""
+    pas = timedelta(minutes=step)
+    for a, b in fenetres:
+        minuit = a.replace(hour=0, minute=0)
+        # Arrondi au multiple de step supérieur
+        h = minuit + pas * -(-(a - minuit) // pas)
+        while h <= b:
+            yield h
+            h += pas
 
 
 # Route affichant la page de gestion des séances (admin uniquement)
-@app.route('/admin/sessions')
+@bp.route('/admin/sessions')
 def ajout_seance_page():
     """Affiche la page de gestion des séances (réservé aux admins)"""
     # Vérifier que l'utilisateur est admin
@@ -208,7 +345,7 @@ def ajout_seance_page():
     return render_template('admin_seances.html')
 
 # Route affichant toutes les séances pour les utilisateurs connectés
-@app.route('/sessions')
+@bp.route('/sessions')
 def seances_page():
     """Affiche la page de visualisation des séances (accessible à tous les connectés)"""
     if 'username' not in session:
@@ -216,14 +353,14 @@ def seances_page():
     return render_template('sessions.html')
 
 # Route pour supprimer une séance et ses réservations (admin uniquement)
-@app.route('/delete_seance/<int:seance_id>', methods=['DELETE'])
+@bp.route('/delete_seance/<int:seance_id>', methods=['DELETE'])
 def delete_seance(seance_id):
     """Supprime une séance et toutes ses réservations (réservé aux admins)"""
     if 'username' not in session or session.get('role') != 'admin':
         return jsonify({'message': 'Accès refusé. Réservé aux administrateurs.'}), 403
     
     try:
-        conn = sqlite3.connect('cinema.db')
+        conn = get_connection()
         cursor = conn.cursor()
         
         # Vérifier si la séance existe
@@ -0,0 +1,10 @@
+"""
+Point d'entrée WSGI pour les serveurs de production
+
+Exemple : gunicorn --preload -w 4 wsgi:app
+Avec --preload, create_app() (schéma et préchargement) s'exécute une seule
+fois dans le processus maître avant le fork des workers.
+"""
+from app import create_app
+
+app = create_app()